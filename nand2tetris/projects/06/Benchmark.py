@@ -0,0 +1,209 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+import typing
+from Parser import Parser, C_FIELDS
+from Code import Code, C_CACHE
+from SymbolTable import SymbolTable
+from StreamAssembler import StreamAssembler
+from BuildCache import toolchain_version
+from Main import read_loops, write_code
+import ProgramGenerator
+
+REPEAT = 5
+# Synthetic programs generated by default: (name, size, label density,
+# variables, shift share)
+SYNTHETIC_PROGRAMS = [
+    ("synthetic-small", 10000, 0.05, 32, 0.05),
+    ("synthetic-rom", 30000, 0.05, 256, 0.05),
+    ("synthetic-labels", 30000, 0.3, 32, 0.05),
+    ("synthetic-shifts", 30000, 0.05, 32, 0.5),
+    ("synthetic-large", 100000, 0.05, 1024, 0.05),
+]
+
+
+def read_c_commands(input_file: typing.TextIO) -> list:
+    """
+    Return all the normalized C_COMMANDs of a given file, in order
+    """
+    commands = []
+    for line in input_file:
+        command = Parser.normalize_line(line)
+        if command and not command.startswith(("@", "(")):
+            commands.append(command)
+    return commands
+
+def get_c_command(command: str) -> str:
+    """
+    Return the binary representation of a normalized C_COMMAND, split and
+    translated again on every call: the reference the cache is timed against
+    """
+    return Code.get_c_fields(*Parser.split_c_command(command))
+
+def encode_c_command(command: str) -> int:
+    """
+    Return the 16-bit code of a normalized C_COMMAND as the assembler gets
+    it, through the memoized split of the Parser and the encoding cache
+    """
+    return Code.encode_c_fields(Parser.classify(command)[1])
+
+def time_encoding(commands: list, encode: typing.Callable) -> float:
+    """
+    Return the best time (in seconds) of encoding all the given commands
+    """
+    best = None
+    for _ in range(REPEAT):
+        C_CACHE.clear()     # The cached encoder pays for every miss again
+        C_FIELDS.clear()
+        start = time.perf_counter()
+        for command in commands:
+            encode(command)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def time_phases(input_path: str, output_path: str) -> dict:
+    """
+    Run every phase of both assembler engines once, and return the time (in
+    seconds) each of them took
+    """
+    phases = {}
+    start = time.perf_counter()
+    with open(input_path, 'r') as input_file:
+        text = input_file.read()
+    phases["read_input"] = time.perf_counter() - start
+
+    C_CACHE.clear()
+    C_FIELDS.clear()
+    start = time.perf_counter()
+    parser = Parser(io.StringIO(text))
+    phases["parse"] = time.perf_counter() - start
+    symbols = SymbolTable()
+    start = time.perf_counter()
+    read_loops(parser, symbols)
+    phases["read_loops"] = time.perf_counter() - start
+    output = io.StringIO()
+    start = time.perf_counter()
+    write_code(parser, symbols, output)
+    phases["write_code"] = time.perf_counter() - start
+
+    C_CACHE.clear()
+    C_FIELDS.clear()
+    assembler = StreamAssembler(SymbolTable())
+    start = time.perf_counter()
+    assembler.assemble(io.StringIO(text))
+    phases["stream_assemble"] = time.perf_counter() - start
+    stream_output = io.StringIO()
+    start = time.perf_counter()
+    assembler.write_code(stream_output)
+    phases["stream_write_code"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with open(output_path, 'w') as output_file:
+        output_file.write(output.getvalue())
+    phases["write_output"] = time.perf_counter() - start
+    return phases
+
+def benchmark_file(input_path: str, name: str, output_path: str) -> dict:
+    """
+    Return the benchmark results of a single .asm file: the best time of
+    every phase over REPEAT runs, and the C_COMMAND encoding time with and
+    without the encoding cache
+    """
+    best = {}
+    for _ in range(REPEAT):
+        for phase, elapsed in time_phases(input_path, output_path).items():
+            best[phase] = min(best.get(phase, elapsed), elapsed)
+    with open(input_path, 'r') as input_file:
+        commands = read_c_commands(input_file)
+    with open(output_path, 'r') as output_file:
+        instructions = sum(1 for _ in output_file)
+    return {
+        "program": name,
+        "bytes": os.path.getsize(input_path),
+        "instructions": instructions,
+        "c_commands": len(commands),
+        "distinct_c_commands": len(set(commands)),
+        "phases": best,
+        "c_encoding": {
+            "uncached": time_encoding(commands, get_c_command),
+            "cached": time_encoding(commands, encode_c_command),
+        },
+    }
+
+def print_results(results: typing.List[dict]) -> None:
+    """
+    Print the benchmark results as a table, with phase times in milliseconds
+    """
+    phases = list(results[0]["phases"]) if results else []
+    print("{:<20}{:>10}".format("program", "instrs") +
+          "".join("{:>18}".format(phase) for phase in phases) +
+          "{:>16}".format("C cache speedup"))
+    for result in results:
+        encoding = result["c_encoding"]
+        print("{:<20}{:>10}".format(result["program"], result["instructions"])
+              + "".join("{:>18.2f}".format(result["phases"][phase] * 1000)
+                        for phase in phases)
+              + "{:>15.1f}x".format(encoding["uncached"] / encoding["cached"]
+                                    if encoding["cached"] else 0))
+
+if "__main__" == __name__:
+    # Benchmarks every .asm file in the given paths, or generated programs
+    argument_parser = argparse.ArgumentParser(prog="Benchmark")
+    argument_parser.add_argument(
+        "input_paths", nargs="*",
+        help=".asm files or directories (default: synthetic programs)")
+    argument_parser.add_argument(
+        "--json", metavar="FILE",
+        help="also write the results to the given file as JSON")
+    argument_parser.add_argument("--seed", type=int, default=0)
+    arguments = argument_parser.parse_args()
+    results = []
+    with tempfile.TemporaryDirectory() as work_directory:
+        output_path = os.path.join(work_directory, "out.hack")
+        if arguments.input_paths:
+            files_to_benchmark = []
+            for argument in arguments.input_paths:
+                argument_path = os.path.abspath(argument)
+                if os.path.isdir(argument_path):
+                    files_to_benchmark += sorted(
+                        os.path.join(argument_path, filename)
+                        for filename in os.listdir(argument_path))
+                else:
+                    files_to_benchmark.append(argument_path)
+            for input_path in files_to_benchmark:
+                if os.path.splitext(input_path)[1].lower() == ".asm":
+                    results.append(benchmark_file(
+                        input_path, os.path.basename(input_path), output_path))
+        else:
+            for name, *parameters in SYNTHETIC_PROGRAMS:
+                input_path = os.path.join(work_directory, name + ".asm")
+                with open(input_path, 'w') as input_file:
+                    ProgramGenerator.write_program(
+                        input_file, *parameters, seed=arguments.seed)
+                result = benchmark_file(input_path, name, output_path)
+                result["parameters"] = dict(zip(
+                    ("size", "label_density", "variables", "shift_share"),
+                    parameters))
+                results.append(result)
+    print_results(results)
+    if arguments.json is not None:
+        with open(arguments.json, 'w') as json_file:
+            json.dump({
+                "toolchain_version": toolchain_version(),
+                "python": platform.python_version(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "repeat": REPEAT,
+                "seed": arguments.seed,
+                "results": results,
+            }, json_file, indent=4)
@@ -0,0 +1,79 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import json
+import os
+import socket
+import sys
+import typing
+
+# Only the modules above are imported, so that starting the client is as
+# cheap as possible. The assembler itself is imported only when no daemon
+# is running.
+
+
+def socket_path() -> str:
+    """
+    Return the path of the daemon socket, $ASSEMBLER_SOCKET if it is set
+    """
+    return os.environ.get("ASSEMBLER_SOCKET") or os.path.join(
+        os.environ.get("TMPDIR", "/tmp"),
+        "hack-assembler-{}.sock".format(os.getuid()))
+
+def send_request(message: dict, path: typing.Optional[str] = None) -> dict:
+    """Sends a single request to the daemon, and waits for its response.
+
+    Args:
+        message (dict): the request.
+        path (str): the socket of the daemon, socket_path() if not given.
+
+    Returns:
+        dict: the response of the daemon.
+
+    Raises:
+        OSError: if no daemon listens on the socket.
+        ValueError: if the daemon closed the connection before it answered,
+            or sent a truncated response.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(path or socket_path())
+        with connection.makefile('rw', encoding="utf-8") as stream:
+            stream.write(json.dumps(message) + "\n")
+            stream.flush()
+            return json.loads(stream.readline())
+
+def main(argv: typing.List[str]) -> int:
+    """Runs the assembler with the given arguments on the daemon, or in this
+    process if no daemon is running.
+
+    Args:
+        argv (typing.List[str]): the arguments of the assembler, or only
+            "--daemon-stats" / "--daemon-stop" to query / stop the daemon.
+
+    Returns:
+        int: the exit status of the assembler.
+    """
+    if argv in (["--daemon-stats"], ["--daemon-stop"]):
+        message = {"command": argv[0][len("--daemon-"):]}
+    else:
+        message = {"command": "assemble", "args": argv, "cwd": os.getcwd()}
+    try:
+        response = send_request(message)
+    except (OSError, ValueError):
+        if message["command"] != "assemble":
+            print("No assembler daemon is running", file=sys.stderr)
+            return 1
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import Main
+        return Main.main(argv)
+    if "stats" in response:
+        print(json.dumps(response["stats"], indent=2))
+    sys.stdout.write(response.get("stdout", ""))
+    sys.stderr.write(response.get("stderr", ""))
+    return response["status"]
+
+if "__main__" == __name__:
+    sys.exit(main(sys.argv[1:]))
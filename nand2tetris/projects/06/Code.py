@@ -15,8 +15,9 @@ COMP_DICT = {
     "!D" : "0001101",
     "!A" : "0110001",
     "!M" : "1110001",
-    "-D" : "1001111",
-    "-A" : "1110011",
+    "-D" : "0001111",
+    "-A" : "0110011",
+    "-M" : "1110011",
     "D+1" : "0011111",
     "A+1" : "0110111",
     "M+1" : "1110111",
@@ -33,6 +34,14 @@ COMP_DICT = {
     "D&M" : "1000000",
     "D|A" : "0010101",
     "D|M" : "1010101",
+    # The commutative operations in the other order, as the VM translator
+    # writes them
+    "A+D" : "0000010",
+    "M+D" : "1000010",
+    "A&D" : "0000000",
+    "M&D" : "1000000",
+    "A|D" : "0010101",
+    "M|D" : "1010101",
     "D>>" : "0010000",
     "D<<" : "0110000",
     "A>>" : "0000000",
@@ -63,6 +72,9 @@ DEST_DICT = {
     "AMD" : "111"
 }
 
+# Memoized encodings, {(dest, comp, jump) of a C_COMMAND : 16-bit code}
+C_CACHE = {}
+
 class Code:
     """Translates Hack assembly language mnemonics into binary codes."""
 
@@ -73,11 +85,34 @@ class Code:
         according to a given symbols table.
         Should be called only if parser.commandType() == "C_COMMAND"
         """
-        c, isShift = Code.comp(parser.comp())
-        d = Code.dest(parser.dest())
-        j = Code.jump(parser.jump())
+        return "{0:016b}".format(
+            Code.encode_c_fields(parser.split_c_instruction()))
+
+    @staticmethod
+    def get_c_fields(dest: str, comp: str, jump: str) -> str:
+        """
+        Return a string holds for the binary representation of the dest,
+        comp and jump fields of a C_COMMAND.
+        """
+        c, isShift = Code.comp(comp)
+        d = Code.dest(dest)
+        j = Code.jump(jump)
         return "101" + c + d + j if isShift else "111" + c + d + j
 
+    @staticmethod
+    def encode_c_fields(fields: tuple) -> int:
+        """
+        Return the 16-bit code of the (dest, comp, jump) fields of a
+        C_COMMAND, as classified by the Parser. Every distinct command (shift
+        variants included) is translated only once, later calls are a single
+        dictionary lookup.
+        """
+        code = C_CACHE.get(fields)
+        if code is None:
+            code = int(Code.get_c_fields(*fields), 2)
+            C_CACHE[fields] = code
+        return code
+
     @staticmethod
     def dest(mnemonic: str) -> str:
         """
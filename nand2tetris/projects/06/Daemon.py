@@ -0,0 +1,175 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import time
+import typing
+import Main
+from Client import socket_path
+
+
+class Daemon:
+    """
+    Keeps the assembler loaded in a long running process, and runs it for
+    requests sent over a Unix socket or over stdin, one JSON line each. Every
+    request runs Main.main() with the given arguments and working directory,
+    and is answered with its exit status and output. The requests are served
+    one at a time, and the latency of each one is kept for the statistics.
+
+    The assembler sources are loaded once, so the daemon should be restarted
+    after they change.
+    """
+
+    def __init__(self) -> None:
+        """Creates a daemon with empty statistics."""
+        self.started = time.perf_counter()
+        self.latencies = []     # Seconds each assemble request took
+        self.stopped = False
+
+    def handle(self, request: dict) -> dict:
+        """Serves a single request.
+
+        Args:
+            request (dict): {"command": "assemble", "args": [...], "cwd": ...}
+                to run the assembler, {"command": "stats"} to get the
+                statistics, or {"command": "stop"} to stop the daemon.
+
+        Returns:
+            dict: the response, with the "status" of the request.
+        """
+        command = request.get("command", "assemble")
+        if command == "stats":
+            return {"status": 0, "stats": self.stats()}
+        if command == "stop":
+            self.stopped = True
+            return {"status": 0, "stats": self.stats()}
+        if command != "assemble":
+            return {"status": 1,
+                    "stderr": "Unknown command: {}\n".format(command)}
+        start = time.perf_counter()
+        stdout, stderr = io.StringIO(), io.StringIO()
+        cwd = os.getcwd()
+        try:
+            os.chdir(request.get("cwd", cwd))
+            with contextlib.redirect_stdout(stdout), \
+                    contextlib.redirect_stderr(stderr):
+                status = Main.main(list(request.get("args", [])))
+        except SystemExit as exception:     # Raised by argparse
+            status = exception.code if isinstance(exception.code, int) \
+                else 0 if exception.code is None else 1
+        except Exception as exception:
+            stderr.write("{}: {}\n".format(type(exception).__name__, exception))
+            status = 1
+        finally:
+            os.chdir(cwd)
+        self.latencies.append(time.perf_counter() - start)
+        return {"status": status, "stdout": stdout.getvalue(),
+                "stderr": stderr.getvalue()}
+
+    def serve_stream(self, input_stream: typing.TextIO,
+                     output_stream: typing.TextIO) -> None:
+        """Serves the requests of a stream until it ends, or until a stop
+        request.
+
+        Args:
+            input_stream (typing.TextIO): requests, one JSON line each.
+            output_stream (typing.TextIO): responses, one JSON line each.
+        """
+        for line in input_stream:
+            if not line.strip():
+                continue
+            try:
+                response = self.handle(json.loads(line))
+            except ValueError as exception:
+                response = {"status": 1, "stderr": "Bad request: {}\n".format(
+                    exception)}
+            output_stream.write(json.dumps(response) + "\n")
+            output_stream.flush()
+            if self.stopped:
+                break
+
+    def serve_socket(self, path: str) -> None:
+        """Listens on a Unix socket, and serves its connections one after the
+        other until a stop request.
+
+        Args:
+            path (str): the path of the socket. A stale socket file left by
+                a daemon that is no longer running is replaced.
+
+        Raises:
+            OSError: if another daemon already listens on the socket.
+        """
+        if os.path.exists(path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                if probe.connect_ex(path) == 0:
+                    raise OSError("a daemon already listens on " + path)
+            os.unlink(path)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(path)
+            server.listen()
+            try:
+                while not self.stopped:
+                    connection, _ = server.accept()
+                    with connection, connection.makefile(
+                            'rw', encoding="utf-8") as stream:
+                        self.serve_stream(stream, stream)
+            finally:
+                os.unlink(path)
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: the number of assemble requests, the rate they were served
+            at and their latency percentiles, in milliseconds.
+        """
+        latencies = sorted(self.latencies)
+        busy = sum(latencies)
+        return {
+            "requests": len(latencies),
+            "uptime_seconds": time.perf_counter() - self.started,
+            "requests_per_second": len(latencies) / busy if busy else 0.0,
+            "latency_ms": {
+                "p50": Daemon.percentile(latencies, 50),
+                "p90": Daemon.percentile(latencies, 90),
+                "p99": Daemon.percentile(latencies, 99),
+                "max": Daemon.percentile(latencies, 100)},
+        }
+
+    @staticmethod
+    def percentile(latencies: typing.List[float], p: float) -> float:
+        """
+        Return the p-th percentile of sorted latencies, in milliseconds
+        """
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1,
+                             int(p / 100 * len(latencies)))] * 1000
+
+if "__main__" == __name__:
+    argument_parser = argparse.ArgumentParser(prog="Daemon")
+    argument_parser.add_argument(
+        "--socket", metavar="PATH",
+        help="the Unix socket to listen on (default: $ASSEMBLER_SOCKET, or "
+             "hack-assembler-<uid>.sock in $TMPDIR)")
+    argument_parser.add_argument(
+        "--stdio", action="store_true",
+        help="serve requests from stdin and answer on stdout instead")
+    arguments = argument_parser.parse_args()
+    daemon = Daemon()
+    try:
+        if arguments.stdio:
+            daemon.serve_stream(sys.stdin, sys.stdout)
+        else:
+            daemon.serve_socket(arguments.socket or socket_path())
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(daemon.stats(), indent=2), file=sys.stderr)
@@ -0,0 +1,142 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import os
+import sys
+import typing
+import numpy as np
+from Code import COMP_DICT, DEST_DICT, JMP_DICT
+from Parser import Parser
+from SymbolTable import SymbolTable
+from StreamAssembler import StreamAssembler
+import RomImage
+
+INVALID = "// invalid instruction "
+
+
+def inverse_table(dictionary: dict, size: int, render: typing.Callable,
+                  keep: typing.Callable = lambda mnemonic: True) -> np.ndarray:
+    """
+    Return a lookup table from binary codes to mnemonics, the inverse of one
+    of the dictionaries in Code.py. Codes with no mnemonic map to "", codes
+    with several (such as D+A and A+D) map to the first one.
+    """
+    table = [""] * size
+    for mnemonic, code in dictionary.items():
+        if keep(mnemonic) and not table[int(code, 2)]:
+            table[int(code, 2)] = render(mnemonic)
+    return np.array(table)
+
+def is_shift(mnemonic: str) -> bool:
+    return mnemonic.endswith(">>") or mnemonic.endswith("<<")
+
+# Indexed by the 7 comp bits of "111" (ALU) and "101" (shift) instructions
+COMP_TABLE = inverse_table(COMP_DICT, 128, str,
+                           lambda mnemonic: not is_shift(mnemonic))
+SHIFT_TABLE = inverse_table(COMP_DICT, 128, str, is_shift)
+# Indexed by the 3 dest / jump bits, with the "=" and ";" separators included
+DEST_TABLE = inverse_table(DEST_DICT, 8, lambda m: m + "=" if m else "")
+JUMP_TABLE = inverse_table(JMP_DICT, 8, lambda m: ";" + m if m else "")
+
+
+def disassemble(rom: typing.Sequence,
+                labels: typing.Optional[dict] = None) -> typing.List[str]:
+    """Decodes a whole ROM at once: the fields of all the instructions are
+    extracted with array bit operations and translated by table lookups.
+
+    Args:
+        rom (typing.Sequence): the 16-bit instructions.
+        labels (dict): an optional {label : ROM address} map. Every label is
+            inserted before the instruction in its address, and the A-commands
+            that load a label address right before a jump are written with the
+            label name.
+
+    Returns:
+        typing.List[str]: the assembly lines.
+    """
+    words = np.asarray(rom, dtype=np.uint16)
+    is_address = words < 0x8000
+    prefix = words >> 13
+    comp = (words >> 6) & 0x7F
+    computation = np.where(prefix == 0b111, COMP_TABLE[comp],
+                           np.where(prefix == 0b101, SHIFT_TABLE[comp], ""))
+    instructions = np.char.add(np.char.add(
+        DEST_TABLE[(words >> 3) & 0x7], computation), JUMP_TABLE[words & 0x7])
+    addresses = np.char.add("@", words.astype(str))
+    if labels:
+        # An A-command followed by a jump loads the address of a label
+        names = {address: name for name, address in labels.items()}
+        jumps = np.zeros(len(words), dtype=bool)
+        jumps[:-1] = ~is_address[1:] & ((words[1:] & 0x7) != 0)
+        addresses = addresses.astype(object)
+        for index in np.nonzero(is_address & jumps)[0]:
+            name = names.get(int(words[index]))
+            if name is not None:
+                addresses[index] = "@" + name
+    lines = np.where(is_address, addresses, instructions).astype(object)
+    invalid = ~is_address & (computation == "")
+    if invalid.any():
+        lines[invalid] = [INVALID + np.binary_repr(word, 16)
+                          for word in words[invalid].tolist()]
+    if labels:
+        order = sorted(labels.items(), key=lambda label: label[1])
+        lines = np.insert(lines, [address for _, address in order],
+                          ["({})".format(name) for name, _ in order])
+    return lines.tolist()
+
+def load_rom(input_path: str) -> np.ndarray:
+    """
+    Return the instructions of a .hack text file or a .hackbin image
+    """
+    if os.path.splitext(input_path)[1].lower() == RomImage.BINARY_EXTENSION:
+        return np.frombuffer(RomImage.map_rom(input_path), dtype=np.uint16)
+    with open(input_path, 'rb') as input_file:
+        lines = input_file.read().split()
+    if not lines:
+        return np.zeros(0, dtype=np.uint16)
+    bits = np.frombuffer(b"".join(lines), dtype=np.uint8).reshape(
+        len(lines), 16) - ord("0")
+    return (bits.astype(np.uint16) << np.arange(15, -1, -1,
+                                                dtype=np.uint16)).sum(
+        axis=1, dtype=np.uint16)
+
+def load_labels(input_path: str) -> dict:
+    """
+    Return the {label : ROM address} map of a symbol map file, with one
+    "label address" pair per line, or of the .asm source of the program
+    """
+    labels = {}
+    with open(input_path, 'r') as input_file:
+        if os.path.splitext(input_path)[1].lower() == ".asm":
+            assembler = StreamAssembler(SymbolTable())
+            assembler.scan_labels(Parser.iterate_records(input_file))
+            return assembler.labels
+        for line in input_file:
+            fields = line.split()
+            if len(fields) == 2:
+                labels[fields[0]] = int(fields[1])
+    return labels
+
+if "__main__" == __name__:
+    # Disassembles a single .hack or .hackbin file
+    argument_parser = argparse.ArgumentParser(prog="Disassembler")
+    argument_parser.add_argument("input_path")
+    argument_parser.add_argument(
+        "--symbols", metavar="FILE",
+        help="a symbol map (\"label address\" lines) or the .asm source, "
+             "to insert the labels of the program")
+    argument_parser.add_argument(
+        "-o", "--output", metavar="FILE",
+        help="write the assembly to this file (default: standard output)")
+    arguments = argument_parser.parse_args()
+    labels = load_labels(arguments.symbols) if arguments.symbols else None
+    lines = disassemble(load_rom(arguments.input_path), labels)
+    if arguments.output is not None:
+        with open(arguments.output, 'w') as output_file:
+            output_file.write("\n".join(lines) + "\n")
+    else:
+        sys.stdout.write("\n".join(lines) + "\n")
@@ -0,0 +1,98 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import contextlib
+import time
+import typing
+from SymbolTable import SymbolTable
+from Parser import A_COMMAND, L_COMMAND
+
+COMMAND_COUNTERS = ("a", "c", "shift_c", "label")
+
+
+class Instrumentation:
+    """
+    Opt-in timers and counters of a single assembled file: the wall and CPU
+    time of every phase the assembler went through, the number of commands
+    of each type, the number of variables allocated from address 16 and the
+    size of the output.
+    """
+
+    def __init__(self, input_path: str = "") -> None:
+        """Creates empty timers and counters.
+
+        Args:
+            input_path (str): the file being assembled, for the report.
+        """
+        self.input_path = input_path
+        self.phases = {}    # {phase : {"wall_seconds": .., "cpu_seconds": ..}}
+        self.counts = dict.fromkeys(COMMAND_COUNTERS, 0)
+        self.variables = 0
+        self.bytes_written = 0
+        self.cache_hit = False
+
+    @staticmethod
+    def measure(instrumentation: typing.Optional["Instrumentation"],
+                phase: str) -> typing.ContextManager:
+        """
+        Return a context that times a phase, or does nothing when the given
+        instrumentation is None
+        """
+        if instrumentation is None:
+            return contextlib.nullcontext()
+        return instrumentation.phase(phase)
+
+    @contextlib.contextmanager
+    def phase(self, phase: str) -> typing.Iterator[None]:
+        """
+        Time the code run in this context, adding it to the given phase
+        """
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            timing = self.phases.setdefault(
+                phase, {"wall_seconds": 0.0, "cpu_seconds": 0.0})
+            timing["wall_seconds"] += time.perf_counter() - wall
+            timing["cpu_seconds"] += time.process_time() - cpu
+
+    def count(self, records: typing.Iterable[tuple]) -> typing.Iterator[tuple]:
+        """
+        Yield the given command records, counting them by type on the
+        way. Once they were all consumed, the symbols that are loaded but
+        neither labels nor predefined are counted as variables, as the
+        assembler allocates them.
+        """
+        counts = self.counts
+        loaded = {}     # {symbol : None}, in order of first appearance
+        labels = set()
+        for record in records:
+            type_code, operand = record
+            if type_code == A_COMMAND:
+                counts["a"] += 1
+                if not operand.isdigit():
+                    loaded[operand] = None
+            elif type_code == L_COMMAND:
+                counts["label"] += 1
+                labels.add(operand)
+            elif operand[1].endswith(("<<", ">>")):     # The comp of a shift
+                counts["shift_c"] += 1
+            else:
+                counts["c"] += 1
+            yield record
+        predefined = SymbolTable()
+        self.variables = sum(1 for sym in loaded if sym not in labels
+                             and not predefined.contains(sym))
+
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            dict: the timers and counters, ready to be written as JSON.
+        """
+        return {"input_path": self.input_path, "cache_hit": self.cache_hit,
+                "phases": self.phases, "commands": self.counts,
+                "variables": self.variables,
+                "bytes_written": self.bytes_written}
@@ -4,12 +4,25 @@ https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
 and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import cProfile
+import functools
+import json
 import os
 import sys
+import time
 import typing
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from SymbolTable import SymbolTable
 from Parser import Parser
 from Code import Code
+from StreamAssembler import StreamAssembler
+from Optimizer import Optimizer
+import RomImage
+from ObjectFile import ObjectFile, OBJECT_EXTENSION
+from BuildCache import BuildCache, MEGABYTE
+from Instrumentation import Instrumentation
 
 
 def read_loops(parser : Parser, symbols : SymbolTable) -> None:
@@ -21,10 +34,9 @@ def read_loops(parser : Parser, symbols : SymbolTable) -> None:
     while parser.has_more_commands():   # First read LOOP symbols
         if parser.command_type() == "L_COMMAND":
             symbols.add_entry(parser.symbol(), line)
-            parser.delete()
         else:
             line += 1
-            parser.advance()
+        parser.advance()    # Labels are skipped by write_code
     parser.reset()
 
 def write_code(parser : Parser, symbols : SymbolTable,
@@ -53,35 +65,432 @@ def write_code(parser : Parser, symbols : SymbolTable,
             output_file.write(code+"\n")
         parser.advance()
 
+def assemble_buffer(
+        records: typing.Iterable[tuple],
+        optimizer: typing.Optional[Optimizer] = None,
+        instrumentation: typing.Optional[Instrumentation] = None
+) -> StreamAssembler:
+    """Assembles normalized commands into the buffer of a StreamAssembler.
+
+    Args:
+        records (typing.Iterable[tuple]): records of the commands, as
+            returned by Parser.iterate_records.
+        optimizer (Optimizer): if given, optimizes the commands before they
+            are encoded.
+        instrumentation (Instrumentation): if given, times the phases and
+            counts the commands.
+
+    Returns:
+        StreamAssembler: the assembler, with all references resolved.
+    """
+    symbols = SymbolTable()             # Symbols Table Initialization
+    assembler = StreamAssembler(symbols)
+    if optimizer is not None:
+        with Instrumentation.measure(instrumentation, "optimize"):
+            records = optimizer.optimize(records)
+    if instrumentation is not None:     # Counted as the engine reads them
+        records = instrumentation.count(records)
+    with Instrumentation.measure(instrumentation, "assemble"):
+        assembler.assemble_records(records)     # Forward labels patched
+    return assembler
+
 def assemble_file(
-        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+        input_file: typing.TextIO, output_file: typing.TextIO,
+        optimizer: typing.Optional[Optimizer] = None,
+        instrumentation: typing.Optional[Instrumentation] = None) -> None:
     """Assembles a single file.
 
     Args:
         input_file (typing.TextIO): the file to assemble.
         output_file (typing.TextIO): writes all output to this file.
+        optimizer (Optimizer): if given, optimizes the commands before they
+            are encoded.
+        instrumentation (Instrumentation): if given, times the phases and
+            counts the commands.
+    """
+    assembler = assemble_buffer(Parser.iterate_records(input_file),
+                                optimizer, instrumentation)
+    with Instrumentation.measure(instrumentation, "write_code"):
+        assembler.write_code(output_file)   # Write the binary code
+
+def assemble_file_binary(
+        input_file: typing.TextIO, output_file: typing.BinaryIO,
+        optimizer: typing.Optional[Optimizer] = None,
+        instrumentation: typing.Optional[Instrumentation] = None) -> None:
+    """Assembles a single file into a packed binary ROM image.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.BinaryIO): writes all output to this file.
+        optimizer (Optimizer): if given, optimizes the commands before they
+            are encoded.
+        instrumentation (Instrumentation): if given, times the phases and
+            counts the commands.
+    """
+    assembler = assemble_buffer(Parser.iterate_records(input_file),
+                                optimizer, instrumentation)
+    with Instrumentation.measure(instrumentation, "write_code"):
+        assembler.write_binary(output_file)     # Write the ROM image
+
+def assemble_file_low_memory(
+        input_file: typing.TextIO, output_file: typing.IO,
+        binary: bool = False,
+        instrumentation: typing.Optional[Instrumentation] = None) -> None:
+    """Assembles a single file in two streaming passes, keeping only the
+    symbol table in memory. Meant for inputs too large to buffer.
+
+    Args:
+        input_file (typing.TextIO): the file to assemble, must be seekable.
+        output_file (typing.IO): writes all output to this file.
+        binary (bool): write a packed ROM image instead of text lines.
+        instrumentation (Instrumentation): if given, times the phases and
+            counts the commands.
     """
     symbols = SymbolTable()             # Symbols Table Initialization
-    parser = Parser(input_file)         # Parser Object
-    read_loops(parser, symbols)         # First reads the loops
-    write_code(parser, symbols, output_file)    # Write the binary code
+    assembler = StreamAssembler(symbols)
+    with Instrumentation.measure(instrumentation, "scan_labels"):
+        # First reads the loops
+        assembler.scan_labels(Parser.iterate_records(input_file))
+    input_file.seek(0)
+    records = Parser.iterate_records(input_file)
+    if instrumentation is not None:
+        records = instrumentation.count(records)
+    with Instrumentation.measure(instrumentation, "stream_code"):
+        assembler.stream_code(records, output_file, binary)
 
-if "__main__" == __name__:
-    # Parses the input path and calls assemble_file on each input file
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: Assembler <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
-    if os.path.isdir(argument_path):
-        files_to_assemble = [
-            os.path.join(argument_path, filename)
-            for filename in os.listdir(argument_path)]
+def assemble_file_object(
+        input_file: typing.TextIO, output_file: typing.TextIO) -> None:
+    """Assembles a single file into a relocatable object, leaving all its
+    symbols to be resolved by link_files().
+
+    Args:
+        input_file (typing.TextIO): the file to assemble.
+        output_file (typing.TextIO): writes the object to this file.
+    """
+    assembler = StreamAssembler(SymbolTable())
+    for type_code, operand in Parser.iterate_records(input_file):
+        assembler.add_record(type_code, operand)
+    assembler.to_object().write(output_file)
+
+def link_files(input_paths: typing.List[str], output_file: typing.IO,
+               binary: bool = False) -> None:
+    """Links object files into a single program. The objects are placed in
+    the given order, so the result is the same as assembling the
+    concatenation of their sources.
+
+    Args:
+        input_paths (typing.List[str]): paths of the objects, in order.
+        output_file (typing.IO): writes all output to this file.
+        binary (bool): write a packed ROM image instead of text lines.
+    """
+    symbols = SymbolTable()             # Symbols Table Initialization
+    assembler = StreamAssembler(symbols)
+    for input_path in input_paths:
+        with open(input_path, 'r') as input_file:
+            assembler.add_object(ObjectFile.read(input_file))
+    assembler.resolve()
+    if binary:
+        assembler.write_binary(output_file)
+    else:
+        assembler.write_code(output_file)
+
+def assemble_source(
+        source: typing.Union[str, bytes, typing.Iterable[str]],
+        optimizer: typing.Optional[Optimizer] = None
+) -> typing.Tuple[array, SymbolTable]:
+    """Assembles a program held in memory, without touching the filesystem.
+
+    Args:
+        source (typing.Union[str, bytes, typing.Iterable[str]]): the program,
+            as a string, UTF-8 bytes or an iterable of lines.
+        optimizer (Optimizer): if given, optimizes the commands before they
+            are encoded.
+
+    Returns:
+        typing.Tuple[array, SymbolTable]: the ROM as an array of 16-bit words,
+        and the symbol table with all the labels and variables resolved.
+    """
+    if isinstance(source, bytes):
+        source = source.decode()
+    if isinstance(source, str):
+        source = source.splitlines()
+    assembler = assemble_buffer(Parser.iterate_records(source), optimizer)
+    return array('H', assembler.words), assembler.symbols
+
+def assemble_path(input_path: str, binary: bool = False,
+                  cache: typing.Optional[BuildCache] = None,
+                  low_memory: bool = False, optimize: bool = False,
+                  relocatable: bool = False,
+                  instrumentation: typing.Optional[Instrumentation] = None
+                  ) -> str:
+    """Assembles the .asm file in the given path, into a file next to it.
+
+    Args:
+        input_path (str): path of the file to assemble.
+        binary (bool): write a packed .hackbin image instead of .hack text.
+        cache (BuildCache): if given, an unchanged file is not assembled
+            again, its previous output is copied from the cache instead.
+        low_memory (bool): assemble with assemble_file_low_memory().
+        optimize (bool): run the peephole optimizer before encoding, and
+            print how much each of its rules saved.
+        relocatable (bool): write a relocatable object file instead.
+        instrumentation (Instrumentation): if given, times the phases,
+            counts the commands and the bytes written.
+
+    Returns:
+        str: the path of the output file.
+    """
+    filename, extension = os.path.splitext(input_path)
+    if relocatable:
+        output_extension = OBJECT_EXTENSION
+    elif binary:
+        output_extension = RomImage.BINARY_EXTENSION
     else:
-        files_to_assemble = [argument_path]
-    for input_path in files_to_assemble:
-        filename, extension = os.path.splitext(input_path)
-        if extension.lower() != ".asm":
-            continue
-        output_path = filename + ".hack"
+        output_extension = ".hack"
+    output_path = filename + output_extension
+    if cache is not None:
+        with open(input_path, 'rb') as input_file:
+            key = cache.key(input_file.read(), output_extension +
+                            (" optimized" if optimize else ""))
+        data = cache.get(key)
+        if data is not None:
+            with open(output_path, 'wb') as output_file:
+                output_file.write(data)
+            if instrumentation is not None:
+                instrumentation.cache_hit = True
+                instrumentation.bytes_written = len(data)
+            return output_path
+    if relocatable:
         with open(input_path, 'r') as input_file, \
-                open(output_path, 'w') as output_file:
-            assemble_file(input_file, output_file)
+                open(output_path, 'w') as output_file, \
+                Instrumentation.measure(instrumentation, "assemble"):
+            assemble_file_object(input_file, output_file)
+    elif low_memory:
+        with open(input_path, 'r') as input_file, \
+                open(output_path, 'wb' if binary else 'w') as output_file:
+            assemble_file_low_memory(input_file, output_file, binary,
+                                     instrumentation)
+    else:
+        optimizer = Optimizer() if optimize else None
+        with open(input_path, 'r') as input_file, \
+                open(output_path, 'wb' if binary else 'w') as output_file:
+            if binary:
+                assemble_file_binary(input_file, output_file, optimizer,
+                                     instrumentation)
+            else:
+                assemble_file(input_file, output_file, optimizer,
+                              instrumentation)
+        if optimizer is not None:
+            print("{}: {}".format(input_path, optimizer.summary()))
+    if instrumentation is not None:
+        instrumentation.bytes_written = os.path.getsize(output_path)
+    if cache is not None:
+        with open(output_path, 'rb') as output_file:
+            cache.put(key, output_file.read())
+    return output_path
+
+def assemble_job(input_path: str, binary: bool = False,
+                 cache: typing.Optional[BuildCache] = None,
+                 low_memory: bool = False, optimize: bool = False,
+                 relocatable: bool = False, instrument: bool = False) -> tuple:
+    """Assembles a single file, catching its errors so that a failing file
+    does not stop the others. Runs in a worker process in parallel mode.
+
+    Args:
+        input_path (str): path of the file to assemble.
+        binary (bool): write a packed .hackbin image instead of .hack text.
+        cache (BuildCache): an optional build cache.
+        low_memory (bool): assemble with assemble_file_low_memory().
+        optimize (bool): run the peephole optimizer before encoding.
+        relocatable (bool): write a relocatable object file instead.
+        instrument (bool): also return the Instrumentation of the file.
+
+    Returns:
+        tuple: (input path, error message or None, CPU seconds spent,
+        whether the output was found in the cache, the instrumentation as a
+        dict or None).
+    """
+    start = time.process_time()
+    hits = cache.hits if cache is not None else 0
+    instrumentation = Instrumentation(input_path) if instrument else None
+    try:
+        assemble_path(input_path, binary, cache, low_memory, optimize,
+                      relocatable, instrumentation)
+        error = None
+    except Exception as exception:
+        error = "{}: {}".format(type(exception).__name__, exception)
+    cache_hit = cache is not None and cache.hits > hits
+    return input_path, error, time.process_time() - start, cache_hit, \
+        instrumentation.to_dict() if instrument else None
+
+def assemble_parallel(files_to_assemble: typing.List[str], jobs: int,
+                      binary: bool = False,
+                      cache: typing.Optional[BuildCache] = None,
+                      low_memory: bool = False, optimize: bool = False,
+                      relocatable: bool = False,
+                      stats: typing.Optional[typing.List[dict]] = None) -> int:
+    """Assembles the given files across a pool of worker processes. Each
+    file gets its own parser and symbol table, and the report is printed in
+    the order of the given files, no matter which worker finished first.
+
+    Args:
+        files_to_assemble (typing.List[str]): paths of .asm files.
+        jobs (int): number of worker processes.
+        binary (bool): write packed .hackbin images instead of .hack text.
+        cache (BuildCache): an optional build cache. The workers use copies
+            of it, their hits and misses are added to it here.
+        low_memory (bool): assemble with assemble_file_low_memory().
+        optimize (bool): run the peephole optimizer before encoding.
+        relocatable (bool): write relocatable object files instead.
+        stats (typing.List[dict]): if given, the Instrumentation of every
+            file is added to it, as a dict.
+
+    Returns:
+        int: the number of files that failed to assemble.
+    """
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(
+            functools.partial(assemble_job, binary=binary, cache=cache,
+                              low_memory=low_memory, optimize=optimize,
+                              relocatable=relocatable,
+                              instrument=stats is not None),
+            files_to_assemble))
+    wall_time = time.perf_counter() - start
+    cpu_time = sum(result[2] for result in results)
+    failed = 0
+    for input_path, error, _, cache_hit, file_stats in results:
+        if stats is not None:
+            stats.append(file_stats)
+        if cache is not None:
+            if cache_hit:
+                cache.hits += 1
+            else:
+                cache.misses += 1
+        if error is not None:
+            failed += 1
+            print("{}: {}".format(input_path, error), file=sys.stderr)
+    print("Assembled {} files ({} failed) with {} jobs: wall {:.3f}s, "
+          "CPU {:.3f}s ({:.1f}x)".format(
+              len(results), failed, jobs, wall_time, cpu_time,
+              cpu_time / wall_time if wall_time else 0))
+    return failed
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    """Parses the command line arguments and assembles (or links) the files
+    they name.
+
+    Args:
+        argv (typing.List[str]): the arguments, sys.argv[1:] if not given.
+
+    Returns:
+        int: the exit status, 1 if any file failed to assemble.
+    """
+    argument_parser = argparse.ArgumentParser(prog="Assembler")
+    argument_parser.add_argument("input_paths", nargs="+",
+                                 metavar="input_path")
+    argument_parser.add_argument(
+        "--binary", action="store_true",
+        help="write packed " + RomImage.BINARY_EXTENSION + " ROM images "
+             "instead of .hack text files")
+    argument_parser.add_argument(
+        "--jobs", type=int, metavar="N",
+        help="assemble the files across a pool of N worker processes")
+    argument_parser.add_argument(
+        "--cache", metavar="DIR",
+        help="skip the files that did not change since they were assembled, "
+             "by keeping their outputs in the given directory")
+    argument_parser.add_argument(
+        "--cache-size", type=int, default=256, metavar="MB",
+        help="the size cap of the cache directory (default: 256 MB)")
+    argument_parser.add_argument(
+        "--low-memory", action="store_true",
+        help="assemble in two streaming passes that keep only the symbol "
+             "table in memory, for very large inputs")
+    argument_parser.add_argument(
+        "--optimize", action="store_true",
+        help="remove redundant loads, dead stores to R13-R15, unreachable "
+             "code and jumps to the next instruction before encoding")
+    argument_parser.add_argument(
+        "--object", action="store_true",
+        help="write relocatable " + OBJECT_EXTENSION + " object files, to be "
+             "linked with --link")
+    argument_parser.add_argument(
+        "--link", metavar="OUTPUT",
+        help="link the given " + OBJECT_EXTENSION + " files, in order, into "
+             "a single program written to OUTPUT")
+    argument_parser.add_argument(
+        "--stats", metavar="FILE",
+        help="write the wall/CPU time of every phase, the commands by type, "
+             "the variables allocated and the bytes written of every file to "
+             "FILE as JSON")
+    argument_parser.add_argument(
+        "--profile", metavar="FILE",
+        help="run under cProfile and dump the profile to FILE (with --jobs, "
+             "only the main process is profiled)")
+    arguments = argument_parser.parse_args(argv)
+    if arguments.optimize and (arguments.low_memory or arguments.object):
+        argument_parser.error("--optimize needs the whole program in memory, "
+                              "it cannot be used with --low-memory or "
+                              "--object")
+    cache = None
+    if arguments.cache is not None:
+        cache = BuildCache(arguments.cache, arguments.cache_size * MEGABYTE)
+    input_extension = OBJECT_EXTENSION if arguments.link else ".asm"
+    files_to_assemble = []
+    for argument_path in map(os.path.abspath, arguments.input_paths):
+        if os.path.isdir(argument_path):
+            files_to_assemble.extend(sorted(
+                os.path.join(argument_path, filename)
+                for filename in os.listdir(argument_path)))
+        else:
+            files_to_assemble.append(argument_path)
+    files_to_assemble = [
+        input_path for input_path in files_to_assemble
+        if os.path.splitext(input_path)[1].lower() == input_extension]
+    if arguments.jobs is not None and arguments.jobs < 1:
+        argument_parser.error("--jobs must be at least 1")
+    stats = [] if arguments.stats is not None else None
+    profile = cProfile.Profile() if arguments.profile is not None else None
+    if profile is not None:
+        profile.enable()
+    try:
+        if arguments.link is not None:
+            with open(arguments.link, 'wb' if arguments.binary else 'w') \
+                    as output_file:
+                link_files(files_to_assemble, output_file, arguments.binary)
+            failed = 0
+        elif arguments.jobs is not None:
+            failed = assemble_parallel(files_to_assemble, arguments.jobs,
+                                       arguments.binary, cache,
+                                       arguments.low_memory,
+                                       arguments.optimize, arguments.object,
+                                       stats)
+        else:
+            failed = 0
+            for input_path in files_to_assemble:
+                instrumentation = None
+                if stats is not None:
+                    instrumentation = Instrumentation(input_path)
+                    stats.append(instrumentation)
+                assemble_path(input_path, arguments.binary, cache,
+                              arguments.low_memory, arguments.optimize,
+                              arguments.object, instrumentation)
+    finally:
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(arguments.profile)
+    if stats is not None:
+        with open(arguments.stats, 'w') as stats_file:
+            json.dump([file_stats.to_dict()
+                       if isinstance(file_stats, Instrumentation)
+                       else file_stats for file_stats in stats],
+                      stats_file, indent=2)
+    if cache is not None:
+        cache.trim()
+        print(cache.summary())
+    return 1 if failed else 0
+
+if "__main__" == __name__:
+    # Parses the input paths and calls assemble_file on each input file
+    sys.exit(main())
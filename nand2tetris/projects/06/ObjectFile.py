@@ -0,0 +1,81 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import json
+import typing
+
+OBJECT_EXTENSION = ".hackobj"
+FORMAT = "hack-object"
+FORMAT_VERSION = 1
+
+
+class ObjectFile:
+    """
+    A relocatable object: the code of a single module, assembled as if it
+    started at address 0, with all its symbols left unresolved. The linker
+    places modules one after the other, moves their labels by the address the
+    module was placed at, and only then resolves the references, so linking
+    objects gives the same ROM as assembling their sources as a single file.
+    """
+
+    def __init__(self, code: typing.List[int], labels: typing.Dict[str, int],
+                 references: typing.List[typing.Tuple[int, str]],
+                 variables: typing.List[str],
+                 wide: typing.List[int] = ()) -> None:
+        """Creates an object.
+
+        Args:
+            code (typing.List[int]): the encoded instructions, with 0 in place
+                of every reference.
+            labels (typing.Dict[str, int]): {label : address in the module} of
+                every label the module defines, all of them are exported.
+            references (typing.List[typing.Tuple[int, str]]): (address,
+                symbol) of every A_COMMAND that loads a symbol, in order.
+            variables (typing.List[str]): the referenced symbols that are
+                neither labels of the module nor predefined. Unless another
+                module defines them as labels, they are variables.
+            wide (typing.List[int]): addresses of A values that do not fit
+                15 bits, which are written as wider lines in .hack files.
+        """
+        self.code = code
+        self.labels = labels
+        self.references = references
+        self.variables = variables
+        self.wide = list(wide)
+
+    def write(self, output_file: typing.TextIO) -> None:
+        """Writes the object as JSON.
+
+        Args:
+            output_file (typing.TextIO): writes all output to this file.
+        """
+        json.dump({"format": FORMAT, "version": FORMAT_VERSION,
+                   "code": self.code, "labels": self.labels,
+                   "references": self.references, "variables": self.variables,
+                   "wide": self.wide}, output_file, separators=(",", ":"))
+
+    @staticmethod
+    def read(input_file: typing.TextIO) -> "ObjectFile":
+        """Reads an object written by write().
+
+        Args:
+            input_file (typing.TextIO): the object file.
+
+        Returns:
+            ObjectFile: the object.
+
+        Raises:
+            ValueError: if the file is not an object of this format version.
+        """
+        data = json.load(input_file)
+        if not isinstance(data, dict) or data.get("format") != FORMAT:
+            raise ValueError("not a Hack object file")
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError("unsupported object version {}".format(
+                data.get("version")))
+        return ObjectFile(data["code"], data["labels"],
+                          [tuple(reference) for reference in data["references"]],
+                          data["variables"], data["wide"])
@@ -0,0 +1,294 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from Parser import A_COMMAND, C_COMMAND, L_COMMAND
+
+# The rules of the optimizer, in the order they are reported
+RULES = ("redundant_load", "store_reload", "dead_store", "unreachable",
+         "trivial_jump")
+# {A value : liveness bit} of the scratch registers of the VM translator
+SCRATCH_REGISTERS = {"R13": 1, "13": 1, "R14": 2, "14": 2, "R15": 4, "15": 4}
+ALL_SCRATCH = 7
+# Memory that may change between two reads, even if the program did not
+# write to it
+VOLATILE = ("KBD", "24576")
+
+
+class Optimizer:
+    """
+    Peephole optimizer over the records of Hack commands, as classified by
+    the Parser, applied before they are encoded. Rules are applied again and
+    again until none of them changes the program, and the number of
+    instructions each rule removed is counted.
+
+    The optimizer relies on every jump landing on a label, as in the code of
+    the VM translator: code that jumps to numeric addresses may break, since
+    removing instructions moves the code after them.
+    """
+
+    def __init__(self) -> None:
+        """Creates an optimizer with empty statistics."""
+        self.saved = dict.fromkeys(RULES, 0)    # {rule : instructions}
+        self.input_size = 0
+        self.output_size = 0
+
+    def optimize(self, records: typing.Iterable[tuple]) -> typing.List[tuple]:
+        """
+        Args:
+            records (typing.Iterable[tuple]): (type code, operand) records of
+                the commands, as returned by Parser.iterate_records.
+
+        Returns:
+            typing.List[tuple]: the records of the optimized commands.
+        """
+        records = list(records)
+        self.input_size += Optimizer.count_instructions(records)
+        while True:
+            optimized = self.remove_unreachable(records)
+            optimized = self.remove_trivial_jumps(optimized)
+            optimized = self.remove_redundant_loads(optimized)
+            optimized = self.remove_dead_stores(optimized)
+            if optimized == records:
+                break
+            records = optimized
+        self.output_size += Optimizer.count_instructions(records)
+        return records
+
+    def summary(self) -> str:
+        """
+        Return a line that describes how much each rule saved
+        """
+        return "{} -> {} instructions ({})".format(
+            self.input_size, self.output_size, ", ".join(
+                "{} {}".format(rule.replace("_", " "), self.saved[rule])
+                for rule in RULES))
+
+    @staticmethod
+    def count_instructions(records: typing.List[tuple]) -> int:
+        """
+        Return the number of commands that are not labels
+        """
+        return sum(1 for type_code, _ in records if type_code != L_COMMAND)
+
+    @staticmethod
+    def referenced_labels(records: typing.List[tuple]) -> typing.Set[str]:
+        """
+        Return the symbols loaded by A_COMMANDs. Only labels among them can be
+        jumped to, the others are entered only from the command before them.
+        """
+        return {operand for type_code, operand in records
+                if type_code == A_COMMAND and not operand.isdigit()}
+
+    def remove_unreachable(self,
+                           records: typing.List[tuple]) -> typing.List[tuple]:
+        """
+        Remove the instructions between an unconditional jump and the next
+        label that is jumped to. Labels are kept, even inside removed code.
+        """
+        referenced = Optimizer.referenced_labels(records)
+        optimized = []
+        reachable = True
+        for record in records:
+            type_code, operand = record
+            if type_code == L_COMMAND:
+                reachable = reachable or operand in referenced
+                optimized.append(record)
+            elif not reachable:
+                self.saved["unreachable"] += 1
+            else:
+                optimized.append(record)
+                reachable = type_code != C_COMMAND or operand[2] != "JMP"
+        return optimized
+
+    def remove_trivial_jumps(
+            self, records: typing.List[tuple]) -> typing.List[tuple]:
+        """
+        Remove '@L' and a jump without a dest that follows it, when L labels
+        the very next instruction. The '@L' is kept unless A is written
+        before it is read, on the path that now falls through to L. A label
+        defined more than once is at its last definition, as in read_loops.
+        """
+        definitions = {}    # {label : index of its last definition}
+        for i, (type_code, operand) in enumerate(records):
+            if type_code == L_COMMAND:
+                definitions[operand] = i
+        optimized = []
+        for i, record in enumerate(records):
+            type_code, operand = record
+            if type_code != C_COMMAND or not operand[2]:
+                optimized.append(record)
+                continue
+            k = i + 1
+            labels = set()
+            while k < len(records) and records[k][0] == L_COMMAND:
+                if definitions[records[k][1]] == k:
+                    labels.add(records[k][1])
+                k += 1
+            if i == 0 or operand[0] or records[i - 1][0] != A_COMMAND \
+                    or records[i - 1][1] not in labels:
+                optimized.append(record)
+                continue
+            self.saved["trivial_jump"] += 1
+            if Optimizer.writes_a_first(records, k):
+                optimized.pop()
+                self.saved["trivial_jump"] += 1
+        return optimized
+
+    def remove_redundant_loads(
+            self, records: typing.List[tuple]) -> typing.List[tuple]:
+        """
+        Remove an '@X' when A already holds X or when the next instruction
+        loads A again, a 'D=M' when D already equals M and an 'M=D' when M
+        already equals D. The knowledge about A and D is dropped on every
+        label that is jumped to.
+        """
+        referenced = Optimizer.referenced_labels(records)
+        optimized = []
+        a = None            # The symbol A holds, if known
+        d_is_m = False      # Whether D equals M[A]
+        for record in records:
+            type_code, operand = record
+            if type_code == L_COMMAND:
+                if operand in referenced:
+                    a, d_is_m = None, False
+                optimized.append(record)
+                continue
+            if type_code == A_COMMAND:
+                if operand == a:
+                    self.saved["redundant_load"] += 1
+                    continue
+                if optimized and optimized[-1][0] == A_COMMAND:
+                    optimized.pop()     # A is loaded again before any use
+                    self.saved["redundant_load"] += 1
+                optimized.append(record)
+                a, d_is_m = operand, False
+                continue
+            dest, comp, jump = operand
+            if d_is_m and a is not None and a not in VOLATILE and not jump \
+                    and (dest, comp) in (("D", "M"), ("M", "D")):
+                self.saved["store_reload"] += 1
+                continue
+            optimized.append(record)
+            if "A" in dest or jump == "JMP":
+                a, d_is_m = None, False
+            elif "M" in dest and "D" in dest:
+                d_is_m = True
+            elif dest == "M":
+                d_is_m = comp == "D"
+            elif dest == "D":
+                d_is_m = comp == "M"
+        return optimized
+
+    def remove_dead_stores(self,
+                           records: typing.List[tuple]) -> typing.List[tuple]:
+        """
+        Remove the stores to R13-R15 whose value is never read again, on any
+        path of the program. The liveness of the three registers is computed
+        backwards over all the jumps of the program, where a jump to an
+        unknown address may land on any label that is jumped to.
+        """
+        referenced = Optimizer.referenced_labels(records)
+        # Forward: the symbol A holds before each command, if known
+        known_a = []
+        a = None
+        for type_code, operand in records:
+            if type_code == L_COMMAND:
+                if operand in referenced:
+                    a = None
+                known_a.append(a)
+            elif type_code == A_COMMAND:
+                known_a.append(a)
+                a = operand
+            else:
+                known_a.append(a)
+                dest, comp, jump = operand
+                if "A" in dest or jump == "JMP":
+                    a = None
+        # Backward: the scratch registers that are live after each command
+        live_out = [0] * len(records)
+        label_live = {}     # {label : registers live when it is entered}
+        changed = True
+        while changed:
+            changed = False
+            any_label = 0
+            for label in referenced:
+                any_label |= label_live.get(label, 0)
+            live = 0
+            entered = set()     # Only the last definition of a label counts
+            for i in range(len(records) - 1, -1, -1):
+                type_code, operand = records[i]
+                if type_code == L_COMMAND:
+                    if operand not in entered:
+                        entered.add(operand)
+                        changed |= label_live.get(operand) != live
+                        label_live[operand] = live
+                    continue
+                if type_code == A_COMMAND:
+                    live_out[i] = live
+                    continue
+                dest, comp, jump = operand
+                out = 0 if jump == "JMP" else live
+                if jump:
+                    target = known_a[i]
+                    if target is not None and target in label_live:
+                        out |= label_live[target]
+                    else:
+                        out |= any_label
+                live_out[i] = out
+                register = SCRATCH_REGISTERS.get(known_a[i], 0)
+                if "M" in dest:
+                    out &= ~register
+                if "M" in comp:
+                    out |= register if known_a[i] is not None \
+                        else ALL_SCRATCH
+                live = out
+        optimized = []
+        for i, record in enumerate(records):
+            type_code, operand = record
+            register = SCRATCH_REGISTERS.get(known_a[i], 0)
+            if type_code != C_COMMAND or not register:
+                optimized.append(record)
+                continue
+            dest, comp, jump = operand
+            if "M" not in dest or jump or live_out[i] & register:
+                optimized.append(record)
+                continue
+            dest = dest.replace("M", "")
+            if dest:
+                optimized.append((C_COMMAND, (dest, comp, jump)))
+            else:
+                self.saved["dead_store"] += 1
+        return optimized
+
+    @staticmethod
+    def writes_a_first(records: typing.List[tuple], start: int) -> bool:
+        """
+        Return whether the commands from the given index on write A before
+        any of them reads it, following the fall-through path up to the end
+        of the program (where the value of A is dropped) or the first jump
+        """
+        for i in range(start, len(records)):
+            record = records[i]
+            type_code, operand = record
+            if type_code == A_COMMAND:
+                return True
+            if Optimizer.reads_a(record):
+                return False
+            if type_code == C_COMMAND and "A" in operand[0]:
+                return True
+        return True
+
+    @staticmethod
+    def reads_a(record: tuple) -> bool:
+        """
+        Return whether the result of a command depends on the value of A
+        """
+        type_code, operand = record
+        if type_code != C_COMMAND:
+            return False
+        dest, comp, jump = operand
+        return "A" in comp or "M" in comp or "M" in dest or bool(jump)
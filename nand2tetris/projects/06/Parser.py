@@ -5,7 +5,18 @@ and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
 import typing
-import re
+from array import array
+
+# Command type codes, and the names command_type() returns for them
+A_COMMAND, C_COMMAND, L_COMMAND = 0, 1, 2
+COMMAND_TYPES = ("A_COMMAND", "C_COMMAND", "L_COMMAND")
+# {first character of a command : its type code}, any other is a C_COMMAND
+TYPE_CODES = {"@": A_COMMAND, "(": L_COMMAND}
+# Memoized splits, {C_COMMAND text : (dest, comp, jump)}. The Hack language
+# has only a few thousand distinct C_COMMANDs, so every one of them is split
+# once and its fields are shared by all its records. A and L commands are
+# not memoized, as a program may hold any number of distinct symbols.
+C_FIELDS = {}
 
 
 class Parser:
@@ -21,19 +32,61 @@ class Parser:
         Args:
             input_file (typing.TextIO): input file.
         """
-        self.__lines = []      # List of all lines and their commands
+        self.__types = array('B')   # Type code of every command
+        self.__operands = []        # Symbol of A/L commands, fields of C ones
         self.__curLine = 0     # Initialize the line reader 'buffer'
         self.initialize_lines(input_file)
 
     def initialize_lines(self, input_file: typing.TextIO) -> None:
         """
-        Initialize the {line : commands} dictionary
+        Classify every command of the input in a single pass, into the
+        parallel type codes and operands arrays
+        """
+        types = self.__types
+        operands = self.__operands
+        for type_code, operand in Parser.iterate_records(
+                input_file.read().splitlines()):
+            types.append(type_code)
+            operands.append(operand)
+
+    @staticmethod
+    def iterate_records(
+            input_file: typing.Iterable[str]) -> typing.Iterator[tuple]:
+        """
+        Yield the (type code, operand) record of every command of a file (or
+        of any iterable of lines) one by one, as classify() returns it. The
+        file is read through its buffer as the records are consumed.
+        """
+        for line in input_file:
+            command = Parser.normalize_line(line)
+            if command:
+                yield Parser.classify(command)
+
+    @staticmethod
+    def classify(command: str) -> tuple:
+        """
+        Return the (type code, operand) record of a normalized command: the
+        symbol or decimal of an A_COMMAND, the label of an L_COMMAND and the
+        (dest, comp, jump) fields of a C_COMMAND
+        """
+        fields = C_FIELDS.get(command)
+        if fields is not None:
+            return C_COMMAND, fields
+        type_code = TYPE_CODES.get(command[0], C_COMMAND)
+        if type_code == A_COMMAND:
+            return A_COMMAND, command[1:]
+        if type_code == L_COMMAND:
+            return L_COMMAND, command[1:-1]
+        fields = C_FIELDS[command] = Parser.split_c_command(command)
+        return C_COMMAND, fields
+
+    @staticmethod
+    def normalize_line(line: str) -> str:
+        """
+        Remove comments and white spaces from a single line of code.
+        Returns an empty string if the line holds no command.
         """
-        input_lines = input_file.read().splitlines()
-        for line in input_lines:
-            l = (line.strip()).split("//")[0]
-            if not l == "":
-                self.__lines.append(re.sub("\s+","",l))
+        return "".join(line.split("//", 1)[0].split())
 
     def has_more_commands(self) -> bool:
         """Are there more commands in the input?
@@ -41,14 +94,7 @@ class Parser:
         Returns:
             bool: True if there are more commands, False otherwise.
         """
-        return len(self.__lines) > self.__curLine
-
-    def delete(self) -> None:
-        """
-        Delete the current line from the parser lines
-        Should only be called if commandType() is "L_COMMAND"
-        """
-        self.__lines.remove(self.__lines[self.__curLine])
+        return len(self.__types) > self.__curLine
 
     def advance(self) -> None:
         """Reads the next command from the input and makes it the current command.
@@ -70,15 +116,7 @@ class Parser:
             "C_COMMAND" for dest=comp;jump
             "L_COMMAND" (actually, pseudo-command) for (Xxx) where Xxx is a symbol
         """
-        current = self.__lines[self.__curLine]
-        if current.startswith("@"):
-            return "A_COMMAND"
-        elif current.startswith("("):
-            return "L_COMMAND"
-        elif current == "":
-            return ""
-        else:
-            return "C_COMMAND"
+        return COMMAND_TYPES[self.__types[self.__curLine]]
 
     def symbol(self) -> str:
         """
@@ -87,16 +125,21 @@ class Parser:
             (Xxx). Should be called only when command_type() is "A_COMMAND" or 
             "L_COMMAND".
         """
-        if self.command_type() == "A_COMMAND":
-            return self.__lines[self.__curLine].replace("@", "")
-        if self.command_type() == "L_COMMAND":
-            return self.__lines[self.__curLine].replace("(", "").replace(")", "")
+        if self.__types[self.__curLine] != C_COMMAND:
+            return self.__operands[self.__curLine]
 
     def split_c_instruction(self):
         """
-        Split the C_COMMAND line into components
+        Return the (dest, comp, jump) components of the current C_COMMAND
+        """
+        return self.__operands[self.__curLine]
+
+    @staticmethod
+    def split_c_command(command: str):
+        """
+        Split a normalized C_COMMAND into its (dest, comp, jump) components
         """
-        dest_split = self.__lines[self.__curLine].split("=")
+        dest_split = command.split("=")
         dest, comp = (dest_split[0],dest_split[1]) if len(dest_split) == 2\
             else ("",dest_split[0])
         comp_split = comp.split(";")
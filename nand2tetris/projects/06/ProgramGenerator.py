@@ -0,0 +1,92 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import argparse
+import random
+import typing
+
+PREDEFINED = ["R{}".format(i) for i in range(16)] + \
+             ["SP", "LCL", "ARG", "THIS", "THAT", "SCREEN", "KBD"]
+COMPUTATIONS = ["0", "1", "-1", "D", "A", "M", "!D", "!M", "-D", "D+1", "A+1",
+                "M+1", "D-1", "A-1", "M-1", "D+A", "D+M", "D-A", "D-M", "A-D",
+                "M-D", "D&A", "D&M", "D|A", "D|M"]
+SHIFTS = ["D<<", "D>>", "A<<", "A>>", "M<<", "M>>"]
+DESTINATIONS = ["M", "D", "MD", "A", "AM", "AD", "AMD"]
+JUMPS = ["JGT", "JEQ", "JGE", "JLT", "JNE", "JLE", "JMP"]
+
+
+def generate_program(size: int, label_density: float = 0.05,
+                     variables: int = 32, shift_share: float = 0.05,
+                     seed: int = 0) -> typing.Iterator[str]:
+    """Yields the lines of a synthetic Hack program. The program is not meant
+    to be run, only to exercise the assembler: it mixes numeric, predefined,
+    variable and label A-commands, jumps forward and backward, and C-commands
+    with and without the shift extension.
+
+    Args:
+        size (int): the number of instructions in the program.
+        label_density (float): the share of instructions preceded by a label.
+        variables (int): the number of distinct variables in use.
+        shift_share (float): the share of C-commands that are shifts.
+        seed (int): the seed of the generator, the same arguments always
+            yield the same program.
+    """
+    generator = random.Random(seed)
+    labels = max(1, round(size * label_density))
+    defined = 0
+    yield "// Synthetic program: {} instructions, {} labels, {} variables, " \
+          "{:.0%} shifts".format(size, labels, variables, shift_share)
+    instruction = 0
+    while instruction < size:
+        if defined < labels and generator.random() < label_density:
+            yield "(LABEL{})".format(defined)
+            defined += 1
+        kind = generator.random()
+        if kind < 0.1 and instruction + 1 < size:   # jump to a label
+            yield "@LABEL{}".format(generator.randrange(labels))
+            yield "D;{}".format(generator.choice(JUMPS))
+            instruction += 2
+            continue
+        if kind < 0.25:
+            yield "@{}".format(generator.randrange(1 << 15))
+        elif kind < 0.4:
+            yield "@{}".format(generator.choice(PREDEFINED))
+        elif kind < 0.5 and variables:
+            yield "@var{}".format(generator.randrange(variables))
+        elif generator.random() < shift_share:
+            yield "{}={}".format(generator.choice(DESTINATIONS),
+                                 generator.choice(SHIFTS))
+        else:
+            yield "{}={}".format(generator.choice(DESTINATIONS),
+                                 generator.choice(COMPUTATIONS))
+        instruction += 1
+    while defined < labels:   # Every referenced label must be defined
+        yield "(LABEL{})".format(defined)
+        defined += 1
+
+def write_program(output_file: typing.TextIO, *args, **kwargs) -> None:
+    """Writes a synthetic program, see generate_program() for the arguments.
+
+    Args:
+        output_file (typing.TextIO): writes the program to this file.
+    """
+    for line in generate_program(*args, **kwargs):
+        output_file.write(line + "\n")
+
+if "__main__" == __name__:
+    # Writes a single synthetic program
+    argument_parser = argparse.ArgumentParser(prog="ProgramGenerator")
+    argument_parser.add_argument("output_path")
+    argument_parser.add_argument("--size", type=int, default=30000)
+    argument_parser.add_argument("--label-density", type=float, default=0.05)
+    argument_parser.add_argument("--variables", type=int, default=32)
+    argument_parser.add_argument("--shift-share", type=float, default=0.05)
+    argument_parser.add_argument("--seed", type=int, default=0)
+    arguments = argument_parser.parse_args()
+    with open(arguments.output_path, 'w') as output_file:
+        write_program(output_file, arguments.size, arguments.label_density,
+                      arguments.variables, arguments.shift_share,
+                      arguments.seed)
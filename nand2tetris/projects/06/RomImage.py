@@ -0,0 +1,58 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import mmap
+import sys
+import typing
+from array import array
+
+BINARY_EXTENSION = ".hackbin"
+
+
+def to_rom(words: typing.Iterable) -> array:
+    """
+    Return the given instructions as a 16-bit words array, little-endian
+    ordered as in the .hackbin format.
+    Raises OverflowError if an instruction does not fit 16 bits.
+    """
+    rom = words if isinstance(words, array) and words.typecode == 'H' \
+        else array('H', words)
+    if sys.byteorder != "little":
+        rom = array('H', rom)
+        rom.byteswap()
+    return rom
+
+def write_rom(words: typing.Iterable, output_file: typing.BinaryIO) -> None:
+    """
+    Write the given instructions to a binary file, as a packed image of
+    little-endian 16-bit words.
+    """
+    output_file.write(to_rom(words).tobytes())
+
+def load_rom(input_path: str) -> array:
+    """
+    Return the instructions of a .hackbin image as a 16-bit words array
+    """
+    rom = array('H')
+    with open(input_path, 'rb') as input_file:
+        rom.frombytes(input_file.read())
+    if sys.byteorder != "little":
+        rom.byteswap()
+    return rom
+
+def map_rom(input_path: str) -> typing.Sequence:
+    """
+    Return the instructions of a .hackbin image as a read-only sequence of
+    16-bit words, backed by a memory map of the file, so the image is not
+    read into memory. On big-endian machines, the image is loaded instead.
+    """
+    if sys.byteorder != "little":
+        return memoryview(load_rom(input_path))
+    with open(input_path, 'rb') as input_file:
+        if not input_file.seek(0, 2):   # mmap does not map empty files
+            return memoryview(b"").cast('H')
+        mapped = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped).cast('H')
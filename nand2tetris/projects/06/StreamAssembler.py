@@ -0,0 +1,274 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+from array import array
+from SymbolTable import SymbolTable
+from Parser import Parser, A_COMMAND, C_COMMAND, L_COMMAND
+from Code import Code
+import RomImage
+from ObjectFile import ObjectFile
+
+FIRST_VARIABLE_ADDRESS = 16
+A_VALUE_LIMIT = 1 << 15     # A values from here on do not fit the 15 bits
+CHUNK_SIZE = 1 << 14        # Instructions written to the output at once
+
+
+class StreamAssembler:
+    """
+    Assembles Hack code in a single pass over the input. Every command is
+    encoded into a buffer as soon as it is read, while references to symbols
+    are recorded and patched once the whole input was read. Symbols are never
+    resolved before that, since a label defined later may still override
+    them (the last definition of a label wins, as in read_loops).
+    """
+
+    def __init__(self, symbols: SymbolTable) -> None:
+        """Creates an empty assembler.
+
+        Args:
+            symbols (SymbolTable): the symbol table to resolve symbols with.
+        """
+        self.symbols = symbols
+        self.words = array('I')     # The encoded instructions
+        self.__fixup_addresses = array('I')     # Addresses of references
+        self.__fixup_symbols = array('I')       # and the symbol id of each
+        self.__symbol_ids = {}      # {symbol : id}, in order of appearance
+        self.__wide = {}    # {address : command} of A values >= A_VALUE_LIMIT
+        self.labels = {}            # {label : ROM address} of this program
+
+    def assemble(self, input_file: typing.TextIO) -> None:
+        """Reads the whole input once, and resolves all the references.
+
+        Args:
+            input_file (typing.TextIO): the file to assemble.
+        """
+        self.assemble_records(Parser.iterate_records(input_file))
+
+    def assemble_records(self, records: typing.Iterable[tuple]) -> None:
+        """Encodes the given commands, and resolves all the references.
+
+        Args:
+            records (typing.Iterable[tuple]): (type code, operand) records of
+                the commands, as returned by Parser.iterate_records.
+        """
+        add_record = self.add_record
+        for type_code, operand in records:
+            add_record(type_code, operand)
+        self.resolve()
+
+    def add_record(self, type_code: int, operand) -> None:
+        """Encodes a single command into the buffer.
+
+        Args:
+            type_code (int): the type code of the command.
+            operand: its operand, as classified by Parser.classify.
+        """
+        if type_code == C_COMMAND:
+            self.words.append(Code.encode_c_fields(operand))
+        elif type_code == A_COMMAND:
+            if operand.isdigit():
+                self.add_address(int(operand))
+            else:   # will be known only at the end
+                self.add_reference(len(self.words), operand)
+                self.words.append(0)
+        else:
+            self.symbols.add_entry(operand, len(self.words))
+            self.labels[operand] = len(self.words)
+
+    def add_address(self, value: int) -> None:
+        """Encodes an A_COMMAND that loads the given value into the buffer.
+
+        Args:
+            value (int): the value to load into the A register.
+        """
+        if value >= A_VALUE_LIMIT:
+            self.__wide[len(self.words)] = "@{}".format(value)
+        self.words.append(value)
+
+    def add_reference(self, address: int, sym: str) -> None:
+        """Records that the instruction in the given address loads a symbol,
+        to be patched by resolve().
+
+        Args:
+            address (int): the address of the A_COMMAND.
+            sym (str): the symbol it loads.
+        """
+        symbol_id = self.__symbol_ids.setdefault(sym, len(self.__symbol_ids))
+        self.__fixup_addresses.append(address)
+        self.__fixup_symbols.append(symbol_id)
+
+    def to_object(self) -> ObjectFile:
+        """Returns the buffer as a relocatable object, with its references
+        left unresolved. Should be called instead of resolve().
+
+        Returns:
+            ObjectFile: the object of the commands added so far.
+        """
+        names = list(self.__symbol_ids)     # In order of first appearance
+        references = [(address, names[symbol_id]) for address, symbol_id
+                      in zip(self.__fixup_addresses, self.__fixup_symbols)]
+        variables = [sym for sym in names if not self.symbols.contains(sym)]
+        return ObjectFile(list(self.words), dict(self.labels), references,
+                          variables, sorted(self.__wide))
+
+    def add_object(self, module: ObjectFile) -> None:
+        """Places the code of an object after the code in the buffer, and
+        records its labels and references as if its commands were added one
+        by one. Objects are linked by adding them in order, then resolve().
+
+        Args:
+            module (ObjectFile): the object to add.
+        """
+        base = len(self.words)
+        self.words.extend(module.code)
+        self.__wide.update((base + address, "@{}".format(module.code[address]))
+                           for address in module.wide)
+        for sym, address in module.labels.items():
+            self.symbols.add_entry(sym, base + address)
+            self.labels[sym] = base + address
+        for address, sym in module.references:
+            self.add_reference(base + address, sym)
+
+    def resolve(self) -> None:
+        """
+        Patch all the recorded references. Symbols that were not defined as
+        labels are variables, allocated from address 16 in order of their
+        first appearance.
+        """
+        n = FIRST_VARIABLE_ADDRESS
+        names = list(self.__symbol_ids)
+        values = []
+        for sym in names:   # In order of first appearance
+            if not self.symbols.contains(sym):
+                self.symbols.add_entry(sym, n)
+                n += 1
+            values.append(self.symbols.get_address(sym))
+        for address, symbol_id in zip(self.__fixup_addresses,
+                                      self.__fixup_symbols):
+            value = values[symbol_id]
+            if value >= A_VALUE_LIMIT:
+                self.__wide[address] = "@" + names[symbol_id]
+            self.words[address] = value
+        self.__fixup_addresses = array('I')
+        self.__fixup_symbols = array('I')
+        self.__symbol_ids = {}
+
+    def write_code(self, output_file: typing.TextIO) -> None:
+        """Writes the buffer as text, one binary instruction per line.
+
+        Args:
+            output_file (typing.TextIO): writes all output to this file.
+        """
+        for start in range(0, len(self.words), CHUNK_SIZE):
+            words = self.words[start:start + CHUNK_SIZE]
+            if not self.__wide:
+                output_file.write("".join(map("{0:016b}\n".format, words)))
+                continue
+            # Programs larger than the ROM have A values wider than 15 bits,
+            # which are written the same way write_code() in Main.py does
+            output_file.write("".join(
+                "0{0:015b}\n".format(word) if address in self.__wide
+                else "{0:016b}\n".format(word)
+                for address, word in enumerate(words, start)))
+
+    def write_binary(self, output_file: typing.BinaryIO) -> None:
+        """Writes the buffer as a packed image of little-endian 16-bit words.
+
+        Args:
+            output_file (typing.BinaryIO): writes all output to this file.
+
+        Raises:
+            ValueError: if an A value does not fit 15 bits, as its word
+                would read as a C-instruction.
+        """
+        if self.__wide:
+            address = min(self.__wide)
+            raise StreamAssembler.wide_value_error(self.__wide[address],
+                                                   address)
+        RomImage.write_rom(self.words, output_file)
+
+    def scan_labels(self, records: typing.Iterable[tuple]) -> None:
+        """First pass of the low memory mode: registers the labels only,
+        without keeping any of the commands.
+
+        Args:
+            records (typing.Iterable[tuple]): records of the commands of the
+                file to assemble, as returned by Parser.iterate_records.
+        """
+        address = 0
+        for type_code, operand in records:
+            if type_code == L_COMMAND:
+                self.symbols.add_entry(operand, address)
+                self.labels[operand] = address
+            else:
+                address += 1
+
+    def stream_code(self, records: typing.Iterable[tuple],
+                    output_file: typing.IO, binary: bool = False) -> None:
+        """Second pass of the low memory mode: encodes the commands as they
+        are read and writes them in chunks, instead of keeping a buffer of the
+        whole program. Should be called after scan_labels(), with the records
+        read from the beginning of the file again.
+
+        Args:
+            records (typing.Iterable[tuple]): records of the commands of the
+                file to assemble, as returned by Parser.iterate_records.
+            output_file (typing.IO): writes all output to this file, a binary
+                file if binary is set and a text file otherwise.
+            binary (bool): write a packed image instead of text lines.
+
+        Raises:
+            ValueError: if binary is set and an A value does not fit 15 bits.
+        """
+        n = FIRST_VARIABLE_ADDRESS
+        address = 0
+        chunk = array('H') if binary else []
+        for type_code, operand in records:
+            if type_code == L_COMMAND:
+                continue
+            if type_code == A_COMMAND:
+                if operand.isdigit():
+                    word = int(operand)
+                elif self.symbols.contains(operand):
+                    word = self.symbols.get_address(operand)
+                else:
+                    self.symbols.add_entry(operand, n)
+                    word = n
+                    n += 1
+                if binary and word >= A_VALUE_LIMIT:
+                    raise StreamAssembler.wide_value_error("@" + operand,
+                                                           address)
+                chunk.append(word if binary else "0{0:015b}\n".format(word))
+            else:
+                word = Code.encode_c_fields(operand)
+                chunk.append(word if binary else "{0:016b}\n".format(word))
+            address += 1
+            if len(chunk) == CHUNK_SIZE:
+                self.__write_chunk(chunk, output_file, binary)
+                chunk = array('H') if binary else []
+        self.__write_chunk(chunk, output_file, binary)
+
+    @staticmethod
+    def wide_value_error(command: str, address: int) -> ValueError:
+        """
+        Return the error of an A-instruction whose value does not fit the
+        15 bits a packed image has for it
+        """
+        return ValueError("{} (ROM address {}) loads a value of more than 15 "
+                          "bits, which cannot be packed".format(command,
+                                                                address))
+
+    @staticmethod
+    def __write_chunk(chunk: typing.Sequence, output_file: typing.IO,
+                      binary: bool) -> None:
+        """
+        Write a chunk of encoded instructions of the low memory mode
+        """
+        if binary:
+            RomImage.write_rom(chunk, output_file)
+        else:
+            output_file.write("".join(chunk))
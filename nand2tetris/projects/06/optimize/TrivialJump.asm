@@ -0,0 +1,11 @@
+// Regression test of Assembler --optimize. The jump to the very next
+// instruction is removed, but @NEXT must be kept: the code that falls
+// through to NEXT reads A (in M=D) before writing it, so the value 100 is
+// stored at the address of NEXT, not at RAM[100].
+@100
+D=A
+@NEXT
+0;JMP
+(NEXT)
+D=D+1
+M=D
@@ -78,6 +78,24 @@ POP = {"constant": CONST_TO_DATA + STACK_TO_DATA + DATA_TO_ADDR,
        "static": STACK_TO_DATA + NEW_STATIC
        }
 
+# Specialized forms of the templates above. The addresses of temp, pointer
+# and static are known at translation time, small indices of the other
+# segments are reached by an A=M+1, A=A+1, ... chain instead of adding the
+# index, and 0, 1 and -1 are written to the stack directly.
+FIXED_ADDRESS = {"temp": ["R{}".format(5 + i) for i in range(8)],
+                 "pointer": ["THIS", "THAT"]}
+PUSH_FIXED = "@{address}\nD=M\n" + DATA_TO_STACK
+POP_FIXED = STACK_TO_DATA + "@{address}\nM=D\n"
+PUSH_SMALL_CONSTANT = "@SP\nAM=M+1\nA=A-1\nM={value}\n"
+SMALL_CONSTANTS = {0: "0", 1: "1"}
+SEGMENT_BASE = "@{segment}\nA=M\n"
+SEGMENT_NEXT = "@{segment}\nA=M+1\n"
+PUSH_NEAR = "{address}D=M\n" + DATA_TO_STACK
+POP_NEAR = STACK_TO_DATA + "{address}M=D\n"
+# The largest indices for which a chain is shorter than adding the index
+PUSH_CHAIN_LIMIT = 2
+POP_CHAIN_LIMIT = 6
+
 
 
 class CodeWriter:
@@ -122,6 +140,21 @@ class CodeWriter:
             segment (str): the memory segment to operate on.
             index (int): the index in the memory segment.
         """
+        if segment == "constant" and command == "C_PUSH" and index in SMALL_CONSTANTS:
+            self.output_stream.write(PUSH_SMALL_CONSTANT.format(value=SMALL_CONSTANTS[index]))
+            return
+        if segment in FIXED_ADDRESS or segment == "static":
+            address = FIXED_ADDRESS[segment][index] if segment in FIXED_ADDRESS \
+                else self.filename + ".{}".format(index)
+            template = PUSH_FIXED if command == "C_PUSH" else POP_FIXED
+            self.output_stream.write(template.format(address=address))
+            return
+        limit = PUSH_CHAIN_LIMIT if command == "C_PUSH" else POP_CHAIN_LIMIT
+        if segment in ("local", "argument", "this", "that") and index <= limit:
+            address = self.chain_address(SEG[segment], index)
+            template = PUSH_NEAR if command == "C_PUSH" else POP_NEAR
+            self.output_stream.write(template.format(address=address))
+            return
         if command == "C_PUSH":
             self.output_stream.write(PUSH[segment].format(
                 index=str(index), segment=SEG[segment],
@@ -131,6 +164,20 @@ class CodeWriter:
                 index=str(index), segment=SEG[segment],
                 static=self.filename+".{}".format(index)))
 
+    @staticmethod
+    def chain_address(segment: str, index: int) -> str:
+        """
+        Args:
+            segment (str): the pointer of the segment, e.g. "LCL".
+            index (int): a small index in the segment.
+
+        Returns:
+            str: code that loads the address of the entry into A.
+        """
+        if index == 0:
+            return SEGMENT_BASE.format(segment=segment)
+        return SEGMENT_NEXT.format(segment=segment) + "A=A+1\n" * (index - 1)
+
     def write_comment(self, comment: str) -> None:
         """
         write as a comment the next VM command that translated.
@@ -0,0 +1,151 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import hashlib
+import os
+import tempfile
+import typing
+
+# The files that take part in producing the output. Changing any of them
+# changes the toolchain version, and with it every cache key. The projects
+# keep their own copy of this module (06 for the assembler, 08 for the VM
+# translator), and this tuple is the only difference between the copies.
+TOOLCHAIN_FILES = ("Main.py", "Parser.py", "CodeWriter.py", "VMOptimizer.py",
+                   "HackWriter.py")
+MEGABYTE = 1 << 20
+
+
+# The hash of the toolchain files, computed by the first call of
+# toolchain_version(), so that runs without a cache do not read them
+TOOLCHAIN_VERSION = None
+
+
+def toolchain_version() -> str:
+    """
+    Return a hash of the toolchain sources
+    """
+    global TOOLCHAIN_VERSION
+    if TOOLCHAIN_VERSION is None:
+        digest = hashlib.sha256()
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for filename in TOOLCHAIN_FILES:
+            with open(os.path.join(directory, filename), 'rb') as source_file:
+                digest.update(source_file.read())
+        TOOLCHAIN_VERSION = digest.hexdigest()
+    return TOOLCHAIN_VERSION
+
+
+class BuildCache:
+    """
+    A directory of previously built outputs, keyed by a hash of the source
+    code, the output format and the toolchain version. Entries are
+    evicted in least recently used order once the directory grows over its
+    size cap.
+    """
+
+    def __init__(self, directory: str, max_size: int) -> None:
+        """Opens (or creates) a cache directory.
+
+        Args:
+            directory (str): the directory that holds the cached outputs.
+            max_size (int): the size cap of the directory, in bytes.
+        """
+        os.makedirs(directory, exist_ok=True)
+        toolchain_version()
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(source: bytes, output_format: str) -> str:
+        """
+        Args:
+            source (bytes): the content of the source file.
+            output_format (str): the kind of output, and the options it was
+                built with.
+
+        Returns:
+            str: the key of the output of the given source.
+        """
+        digest = hashlib.sha256()
+        digest.update(toolchain_version().encode())
+        digest.update(output_format.encode() + b"\0")
+        digest.update(source)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> typing.Optional[bytes]:
+        """Returns the cached output of the given key, or None on a miss.
+        A hit marks the entry as the most recently used.
+
+        Args:
+            key (str): a key, as returned by key().
+        """
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, 'rb') as cached_file:
+                data = cached_file.read()
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        """Stores an output in the cache. The entry is written to a temporary
+        file first, so concurrent processes never see a partial entry.
+
+        Args:
+            key (str): a key, as returned by key().
+            data (bytes): the output to store.
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, os.path.join(self.directory, key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def entries(self) -> typing.List[os.DirEntry]:
+        """
+        Returns:
+            typing.List[os.DirEntry]: the entries in the cache directory.
+        """
+        return [entry for entry in os.scandir(self.directory)
+                if entry.is_file() and not entry.name.endswith(".tmp")]
+
+    def trim(self) -> None:
+        """
+        Evict the least recently used entries until the cache directory is
+        not larger than its size cap
+        """
+        entries = sorted(((entry.stat().st_mtime, entry.stat().st_size,
+                           entry.path) for entry in self.entries()))
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in entries:
+            if size <= self.max_size:
+                break
+            os.unlink(path)
+            size -= entry_size
+            self.evictions += 1
+
+    def summary(self) -> str:
+        """
+        Returns:
+            str: the hit/miss statistics and the size of the cache.
+        """
+        entries = self.entries()
+        lookups = self.hits + self.misses
+        return "Cache: {} hits, {} misses ({:.0%} hit rate), {} evicted, " \
+               "{:.1f} MB in {} entries".format(
+                   self.hits, self.misses,
+                   self.hits / lookups if lookups else 0, self.evictions,
+                   sum(entry.stat().st_size for entry in entries) / MEGABYTE,
+                   len(entries))
@@ -41,7 +41,14 @@ SP_RET_UPDATE = "@{segment}\nMD=M+1\n@SP\nM=D\n"
 UPDATE_SEGS = "@R13\nD=M\n@{index}\nD=D-A\nA=D\nD=M\n@{segment}\nM=D\n"
 PUSH_SEG_ADDRESS = "@{segment}\nD=M\n" + DATA_TO_STACK
 RETURN_LABEL = "@{label}\nD=A\n" + DATA_TO_STACK
-TODO_N_TIMES = "@i\nM=0\n@{num}\nD=A\n@N\nM=D\n({label})\n@N\nD=M\n@i\nD=D-M\n@{endlabel}\nD;JEQ\n{TODO}@i\nM=M+1\n@{label}\n0;JMP\n({endlabel})\n"
+# Up to UNROLL_LOCALS locals are cleared by straight-line code, more than
+# that by a loop that counts down in D
+UNROLL_LOCALS = 8
+ONE_LOCAL = "@SP\nAM=M+1\nA=A-1\nM=0\n"
+FIRST_LOCAL = "@SP\nA=M\nM=0\n"
+NEXT_LOCAL = "A=A+1\nM=0\n"
+LOCALS_TO_SP = "D=A+1\n@SP\nM=D\n"
+CLEAR_LOCALS_LOOP = "@{num}\nD=A\n({label})\n@SP\nAM=M+1\nA=A-1\nM=0\nD=D-1\n@{label}\nD;JGT\n"
 
 
 UPDATE_THAT = UPDATE_SEGS.format(index=1, segment=SEG["that"])
@@ -50,6 +57,15 @@ UPDATE_ARG = UPDATE_SEGS.format(index=3, segment=SEG["argument"])
 UPDATE_LCL = UPDATE_SEGS.format(index=4, segment=SEG["local"])
 REPOSITION_ARG = "@SP\nD=M\n@5\nD=D-A\n@{nArgs}\nD=D-A\n@ARG\nM=D\n"
 REPOSITION_LCL = "@SP\nD=M\n@LCL\nM=D\n"
+# A tail call from a function that got as many arguments as it passes moves
+# them over its own, and jumps with the frame as it is. Otherwise it is a
+# call followed by a return, as usual
+SAME_FRAME_SIZE = "@LCL\nD=M\n@ARG\nD=D-M\n@{frame_size}\nD=D-A\n@{label}\nD;JNE\n"
+ARGUMENT_FROM_TOP = "@SP\nA=M-1\n"
+FIRST_ARGUMENT_TO_TEMP = "@SP\nD=M\n@{nArgs}\nD=D-A\n@R13\nM=D\n@ARG\nD=M\n@R15\nM=D\n"
+MOVE_ARGUMENT = "@R13\nAM=M+1\nA=A-1\nD=M\n@R15\nAM=M+1\nA=A-1\nM=D\n"
+CHAIN_ARGUMENTS_LIMIT = 4   # More arguments are moved through pointers
+SP_TO_LCL = "@LCL\nD=M\n@SP\nM=D\n"
 
 PUSH = {
     "constant": CONST_TO_DATA + DATA_TO_STACK,
@@ -73,11 +89,49 @@ POP = {
     "static": STACK_TO_DATA + NEW_STATIC
 }
 
+# Specialized forms of the templates above. The addresses of temp, pointer
+# and static are known at translation time, small indices of the other
+# segments are reached by an A=M+1, A=A+1, ... chain instead of adding the
+# index, and 0, 1 and -1 are written to the stack directly.
+FIXED_ADDRESS = {"temp": ["R{}".format(5 + i) for i in range(8)],
+                 "pointer": ["THIS", "THAT"]}
+FIXED_TO_DATA = "@{address}\nD=M\n"
+DATA_TO_FIXED = "@{address}\nM=D\n"
+PUSH_FIXED = FIXED_TO_DATA + DATA_TO_STACK
+POP_FIXED = STACK_TO_DATA + DATA_TO_FIXED
+PUSH_SMALL_CONSTANT = "@SP\nAM=M+1\nA=A-1\nM={value}\n"
+SMALL_CONSTANTS = {0: "0", 1: "1"}
+SEGMENT_BASE = "@{segment}\nA=M\n"
+SEGMENT_NEXT = "@{segment}\nA=M+1\n"
+NEAR_TO_DATA = "{address}D=M\n"
+DATA_TO_NEAR = "{address}M=D\n"
+PUSH_NEAR = NEAR_TO_DATA + DATA_TO_STACK
+POP_NEAR = STACK_TO_DATA + DATA_TO_NEAR
+NEAR_SEGMENTS = ("local", "argument", "this", "that")
+# The largest indices for which a chain is shorter than adding the index
+PUSH_CHAIN_LIMIT = 2
+POP_CHAIN_LIMIT = 6
+
+# When the top of the stack is cached in D, a push only loads D (after the
+# previous top is spilled to the stack), and a pop stores D
+PUSH_DATA = {
+    "constant": CONST_TO_DATA,
+    "local": SEG_TO_DATA,
+    "argument": SEG_TO_DATA,
+    "this": SEG_TO_DATA,
+    "that": SEG_TO_DATA,
+    "temp": POINTER_OR_TEMP_TO_DATA,
+    "pointer": POINTER_OR_TEMP_TO_DATA,
+    "static": STATIC_TO_DATA
+}
+SMALL_CONSTANT_TO_DATA = "D={value}\n"
+
        ########################### BRANCHING ##############################
 
 NEW_LABEL = "({label})\n"
 GOTO = "@{label}\n0;JMP\n"
 IF_GOTO = STACK_TO_DATA + "@{label}\nD;JNE\n"
+CACHED_IF_GOTO = "@{label}\nD;JNE\n"    # The popped value is already in D
 FUNCTION = "({label})\n"
 GOTO_RET_ADD = "@R14\nA=M\n0;JMP\n"
 
@@ -95,42 +149,127 @@ END = "(END)\n@END\n0;JMP"
 ARITHMETIC = {"add": "@SP\nAM=M-1\nD=M\nA=A-1\nM=D+M\n",
               "sub": "@SP\nAM=M-1\nD=M\nA=A-1\nM=M-D\n",
               "neg": "@SP\nA=M\nA=A-1\nM=-M\n",
-              "eq": "@SP\nAM=M-1\nD=M\n@R13\nM=D\n@SP\nA=M-1\nD=M\nM=0\n@R14\nM=D\n@R14\nD=M\n@X_POS{index}\nD;JGT\n"
-                    "@R13\nD=M\n@END{index}\nD;JGT\n@CHECK{index}\n0;JMP\n(X_POS{index})\n   @R13\n  D=M\n   @END{index}"
-                    "\n   D;JLT\n(CHECK{index})\n   @R14\n   D=M\n   @R13\n    M=M-D\n   @R13\n    D=M\n   @TRUE{index}"
-                    "\n   D;JEQ\n   @END{index}\n    0;JMP\n(TRUE{index})\n    @SP\n    A=M-1\n    M=-1\n   @END{index}\n"
-                    "   0;JMP\n(END{index})\n",
-              "gt": "@SP\nAM=M-1\nD=M\n@R13\nM=D\n@SP\nA=M-1\nD=M\nM=0\n@R14\nM=D\n@R14\nD=M\n@X_POS{index}\nD;JGT\n"
-                    "@R13\nD=M\n@END{index}\nD;JGT\n@CHECK{index}\n0;JMP\n(X_POS{index})\n   @R13\n  D=M\n   @TRUE{index}"
-                    "\n   D;JLT\n(CHECK{index})\n   @R14\n   D=M\n   @R13\n    M=D-M\n   @R13\n    D=M\n   @TRUE{index}"
-                    "\n   D;JGT\n   @END{index}\n    0;JMP\n(TRUE{index})\n    @SP\n    A=M-1\n    M=-1\n    @END{index}\n"
-                    "   0;JMP\n(END{index})\n",
-              "lt": "@SP\nAM=M-1\nD=M\n@R13\nM=D\n@SP\nA=M-1\nD=M\nM=0\n@R14\nM=D\n@R14\nD=M\n@X_POS{index}\nD;JGT\n"
-                    "@R13\nD=M\n@TRUE{index}\nD;JGT\n@CHECK{index}\n0;JMP\n(X_POS{index})\n   @R13\n  D=M\n   @END{index}"
-                    "\n   D;JLT\n(CHECK{index})\n   @R14\n   D=M\n   @R13\n    M=D-M\n   @R13\n    D=M\n   @TRUE{index}"
-                    "\n   D;JLT\n   @END{index}\n    0;JMP\n(TRUE{index})\n    @SP\n    A=M-1\n    M=-1\n    @END{index}\n"
-                    "   0;JMP\n(END{index})\n",
+              "eq": "@SP\nAM=M-1\nD=M\n@R13\nM=D\n@SP\nA=M-1\nD=M\nM=0\n@R14\nM=D\n@R14\nD=M\n@{namespace}$$X_POS{index}\nD;JGT\n"
+                    "@R13\nD=M\n@{namespace}$$END{index}\nD;JGT\n@{namespace}$$CHECK{index}\n0;JMP\n({namespace}$$X_POS{index})\n   @R13\n  D=M\n   @{namespace}$$END{index}"
+                    "\n   D;JLT\n({namespace}$$CHECK{index})\n   @R14\n   D=M\n   @R13\n    M=M-D\n   @R13\n    D=M\n   @{namespace}$$TRUE{index}"
+                    "\n   D;JEQ\n   @{namespace}$$END{index}\n    0;JMP\n({namespace}$$TRUE{index})\n    @SP\n    A=M-1\n    M=-1\n   @{namespace}$$END{index}\n"
+                    "   0;JMP\n({namespace}$$END{index})\n",
+              "gt": "@SP\nAM=M-1\nD=M\n@R13\nM=D\n@SP\nA=M-1\nD=M\nM=0\n@R14\nM=D\n@R14\nD=M\n@{namespace}$$X_POS{index}\nD;JGT\n"
+                    "@R13\nD=M\n@{namespace}$$END{index}\nD;JGT\n@{namespace}$$CHECK{index}\n0;JMP\n({namespace}$$X_POS{index})\n   @R13\n  D=M\n   @{namespace}$$TRUE{index}"
+                    "\n   D;JLT\n({namespace}$$CHECK{index})\n   @R14\n   D=M\n   @R13\n    M=D-M\n   @R13\n    D=M\n   @{namespace}$$TRUE{index}"
+                    "\n   D;JGT\n   @{namespace}$$END{index}\n    0;JMP\n({namespace}$$TRUE{index})\n    @SP\n    A=M-1\n    M=-1\n    @{namespace}$$END{index}\n"
+                    "   0;JMP\n({namespace}$$END{index})\n",
+              "lt": "@SP\nAM=M-1\nD=M\n@R13\nM=D\n@SP\nA=M-1\nD=M\nM=0\n@R14\nM=D\n@R14\nD=M\n@{namespace}$$X_POS{index}\nD;JGT\n"
+                    "@R13\nD=M\n@{namespace}$$TRUE{index}\nD;JGT\n@{namespace}$$CHECK{index}\n0;JMP\n({namespace}$$X_POS{index})\n   @R13\n  D=M\n   @{namespace}$$END{index}"
+                    "\n   D;JLT\n({namespace}$$CHECK{index})\n   @R14\n   D=M\n   @R13\n    M=D-M\n   @R13\n    D=M\n   @{namespace}$$TRUE{index}"
+                    "\n   D;JLT\n   @{namespace}$$END{index}\n    0;JMP\n({namespace}$$TRUE{index})\n    @SP\n    A=M-1\n    M=-1\n    @{namespace}$$END{index}\n"
+                    "   0;JMP\n({namespace}$$END{index})\n",
               "and": "@SP\nAM=M-1\nD=M\nA=A-1\nM=D&M\n",
               "or": "@SP\nAM=M-1\nD=M\nA=A-1\nM=D|M\n",
               "not": "@SP\nA=M\nA=A-1\nM=!M\n",
               "shiftleft": "@SP\nA=M\nA=A-1\nM=M<<\n",
               "shiftright": "@SP\nA=M\nA=A-1\nM=M>>\n"}
 
+# The arithmetic commands that keep their result in D, when the top of the
+# stack is cached there. x is popped from the stack, y is D
+CACHED_ARITHMETIC = {"add": "@SP\nAM=M-1\nD=D+M\n",
+                     "sub": "@SP\nAM=M-1\nD=M-D\n",
+                     "and": "@SP\nAM=M-1\nD=D&M\n",
+                     "or": "@SP\nAM=M-1\nD=D|M\n",
+                     "neg": "D=-D\n",
+                     "not": "D=!D\n",
+                     "shiftleft": "D=D<<\n",
+                     "shiftright": "D=D>>\n"}
+
+    ####################### SHARED ROUTINES ############################
+
+### NOTICE: the shared routines are called with the return address in D.
+### The comparisons keep it in R15, $$CALL pushes it as the return address
+### of the called function, and $$RETURN is jumped to without one. Their labels start with "$$", which no VM label
+### or function name can produce.
+
+ROUTINE = "$${name}"
+HALT = "($$HALT)\n@$$HALT\n0;JMP\n"
+CALL_ROUTINE = "@{return_label}\nD=A\n@{routine}\n0;JMP\n({return_label})\n"
+# x, y are popped and x ? y is pushed. When x and y have different signs,
+# x - y may overflow, so the result is decided by their signs alone
+SIGNED_COMPARE = ("({routine})\n@R15\nM=D\n@SP\nAM=M-1\nD=M\n@R13\nM=D\n"
+                  "@SP\nA=M-1\nD=M\n@{routine}$X_NEG\nD;JLT\n"
+                  "@R13\nD=M\n@{routine}$SAME_SIGN\nD;JGE\n"
+                  "D={x_pos_y_neg}\n@{routine}$END\n0;JMP\n"
+                  "({routine}$X_NEG)\n@R13\nD=M\n@{routine}$SAME_SIGN\nD;JLT\n"
+                  "D={x_neg_y_pos}\n@{routine}$END\n0;JMP\n"
+                  "({routine}$SAME_SIGN)\n@SP\nA=M-1\nD=M\n@R13\nD=D-M\n"
+                  "@{routine}$TRUE\nD;{jump}\nD=0\n@{routine}$END\n0;JMP\n"
+                  "({routine}$TRUE)\nD=-1\n"
+                  "({routine}$END)\n@SP\nA=M-1\nM=D\n@R15\nA=M\n0;JMP\n")
+# x - y is 0 exactly when x == y, even if the subtraction overflows
+EQUAL_COMPARE = ("({routine})\n@R15\nM=D\n@SP\nAM=M-1\nD=M\nA=A-1\nD=M-D\n"
+                 "@{routine}$TRUE\nD;JEQ\nD=0\n@{routine}$END\n0;JMP\n"
+                 "({routine}$TRUE)\nD=-1\n"
+                 "({routine}$END)\n@SP\nA=M-1\nM=D\n@R15\nA=M\n0;JMP\n")
+
+# The call site keeps the called function in R13 and the number of its
+# arguments in R14, the return address is pushed from D
+LOAD_CALL_TARGET = "@{function}\nD=A\n@R13\nM=D\n"
+LOAD_NUM_ARGS = {0: "@R14\nM=0\n", 1: "@R14\nM=1\n"}
+LOAD_NUM_ARGS_DEFAULT = "@{nArgs}\nD=A\n@R14\nM=D\n"
+SHARED_CALL = ("({routine})\n" + DATA_TO_STACK
+               + PUSH_SEG_ADDRESS.format(segment="LCL")
+               + PUSH_SEG_ADDRESS.format(segment="ARG")
+               + PUSH_SEG_ADDRESS.format(segment="THIS")
+               + PUSH_SEG_ADDRESS.format(segment="THAT")
+               + "@R14\nD=M\n@5\nD=D+A\n@SP\nD=M-D\n@ARG\nM=D\n"
+               + REPOSITION_LCL + "@R13\nA=M\n0;JMP\n")
+SHARED_RETURN = ("({routine})\n" + VALUE_TO_TEMP.format(segment=SEG["local"])
+                 + RET_ADDRESS
+                 + POP["argument"].format(index=0, segment=SEG["argument"])
+                 + SP_RET_UPDATE.format(segment=SEG["argument"])
+                 + UPDATE_THAT + UPDATE_THIS + UPDATE_ARG + UPDATE_LCL
+                 + GOTO_RET_ADD)
+
+COMPARE_ROUTINES = {
+    "eq": EQUAL_COMPARE.format(routine=ROUTINE.format(name="EQ")),
+    "gt": SIGNED_COMPARE.format(routine=ROUTINE.format(name="GT"),
+                                x_pos_y_neg=-1, x_neg_y_pos=0, jump="JGT"),
+    "lt": SIGNED_COMPARE.format(routine=ROUTINE.format(name="LT"),
+                                x_pos_y_neg=0, x_neg_y_pos=-1, jump="JLT"),
+}
+ROUTINES = dict(COMPARE_ROUTINES,
+                call=SHARED_CALL.format(routine=ROUTINE.format(name="CALL")),
+                **{"return": SHARED_RETURN.format(
+                    routine=ROUTINE.format(name="RETURN"))})
+
 
 class CodeWriter:
     """Translates VM commands into Hack assembly code."""
 
-    def __init__(self, output_stream: typing.TextIO) -> None:
+    def __init__(self, output_stream: typing.TextIO,
+                 shared_compare: bool = False,
+                 shared_call: bool = False,
+                 cache_tos: bool = False) -> None:
         """Initializes the CodeWriter.
 
         Args:
             output_stream (typing.TextIO): output stream.
+            shared_compare (bool): translate eq, gt and lt into calls of a
+                shared routine of each kind, instead of inlining them.
+            shared_call (bool): translate call and return into jumps to the
+                shared $$CALL and $$RETURN routines, instead of inlining the
+                whole calling convention.
+            cache_tos (bool): keep the top of the stack in D between
+                commands, and write it to the stack only when needed.
         """
         self.output_stream = output_stream
         self.filename = ""
         self.cur_function = ""
         self.general_continue_index = 0
         self.return_counter = 0
+        self.shared_compare = shared_compare
+        self.shared_call = shared_call
+        self.cache_tos = cache_tos
+        self.tos_in_d = False   # Whether the top of the stack is in D
+        self.routines = set()   # The shared routines this writer called
 
     def set_file_name(self, filename: str) -> None:
         """Informs the code writer that the translation of a new VM file is 
@@ -140,6 +279,7 @@ class CodeWriter:
             filename (str): The name of the VM file.
         """
         self.filename = filename
+        self.cur_function = filename    # Labels outside functions belong to the file
 
     def write_arithmetic(self, command: str) -> None:
         """Writes the assembly code that is the translation of the given 
@@ -148,7 +288,15 @@ class CodeWriter:
         Args:
             command (str): an arithmetic command.
         """
-        self.output_stream.write(ARITHMETIC[command].format(index = self.general_continue_index))
+        if self.tos_in_d and command in CACHED_ARITHMETIC:
+            self.output_stream.write(CACHED_ARITHMETIC[command])
+            return
+        self.spill()
+        if self.shared_compare and command in COMPARE_ROUTINES:
+            self.write_routine_call(command, "{}$${}.{}".format(
+                self.filename, command, self.general_continue_index))
+        else:
+            self.output_stream.write(ARITHMETIC[command].format(index = self.general_continue_index, namespace=self.filename))
         if command in ["gt", "lt", "eq"]:
             self.general_continue_index += 1
 
@@ -161,6 +309,22 @@ class CodeWriter:
             segment (str): the memory segment to operate on.
             index (int): the index in the memory segment.
         """
+        if self.cache_tos:
+            self.write_cached_push_pop(command, segment, index)
+            return
+        if segment == "constant" and command == "C_PUSH" and index in SMALL_CONSTANTS:
+            self.output_stream.write(PUSH_SMALL_CONSTANT.format(value=SMALL_CONSTANTS[index]))
+            return
+        if segment in FIXED_ADDRESS or segment == "static":
+            template = PUSH_FIXED if command == "C_PUSH" else POP_FIXED
+            self.output_stream.write(template.format(address=self.fixed_address(segment, index)))
+            return
+        limit = PUSH_CHAIN_LIMIT if command == "C_PUSH" else POP_CHAIN_LIMIT
+        if segment in NEAR_SEGMENTS and index <= limit:
+            address = self.chain_address(SEG[segment], index)
+            template = PUSH_NEAR if command == "C_PUSH" else POP_NEAR
+            self.output_stream.write(template.format(address=address))
+            return
         if command == "C_PUSH":
             self.output_stream.write(PUSH[segment].format(
                 index=str(index), segment=SEG[segment],
@@ -170,6 +334,114 @@ class CodeWriter:
                 index=str(index), segment=SEG[segment],
                 static=self.filename+".{}".format(index)))
 
+    def write_cached_push_pop(self, command: str, segment: str,
+                              index: int) -> None:
+        """Writes a push or a pop of the top of stack caching mode, in which
+        a push leaves the pushed value in D instead of on the stack.
+
+        Args:
+            command (str): "C_PUSH" or "C_POP".
+            segment (str): the memory segment to operate on.
+            index (int): the index in the memory segment.
+        """
+        if command == "C_PUSH":
+            self.spill()
+            self.output_stream.write(self.load_data(segment, index))
+            self.tos_in_d = True
+            return
+        if segment in FIXED_ADDRESS or segment == "static":
+            store = DATA_TO_FIXED.format(address=self.fixed_address(segment, index))
+        elif segment in NEAR_SEGMENTS and index <= POP_CHAIN_LIMIT:
+            store = DATA_TO_NEAR.format(address=self.chain_address(SEG[segment], index))
+        else:   # The address is computed in D, so the value must be popped
+            self.spill()
+            self.output_stream.write(POP[segment].format(
+                index=str(index), segment=SEG[segment],
+                static=self.filename+".{}".format(index)))
+            return
+        if not self.tos_in_d:
+            self.output_stream.write(STACK_TO_DATA)
+        self.output_stream.write(store)
+        self.tos_in_d = False
+
+    def write_move(self, source_segment: str, source_index: int,
+                   segment: str, index: int) -> None:
+        """Writes the translation of a push followed by a pop, which moves the
+        value directly instead of through the stack.
+
+        Args:
+            source_segment (str): the memory segment of the push.
+            source_index (int): the index in the segment of the push.
+            segment (str): the memory segment of the pop.
+            index (int): the index in the segment of the pop.
+        """
+        self.spill()
+        load = self.load_data(source_segment, source_index)
+        if segment in FIXED_ADDRESS or segment == "static":
+            self.output_stream.write(load + DATA_TO_FIXED.format(
+                address=self.fixed_address(segment, index)))
+        elif index <= POP_CHAIN_LIMIT:
+            self.output_stream.write(load + DATA_TO_NEAR.format(
+                address=self.chain_address(SEG[segment], index)))
+        else:   # The address is computed before the value is loaded
+            self.output_stream.write(
+                SAVE_ADDR.format(index=str(index), segment=SEG[segment])
+                + load + DATA_TO_ADDR)
+
+    def load_data(self, segment: str, index: int) -> str:
+        """
+        Args:
+            segment (str): the memory segment to read.
+            index (int): the index in the memory segment.
+
+        Returns:
+            str: code that loads the entry into D, without changing the stack.
+        """
+        if segment == "constant" and index in SMALL_CONSTANTS:
+            return SMALL_CONSTANT_TO_DATA.format(value=SMALL_CONSTANTS[index])
+        if segment in FIXED_ADDRESS or segment == "static":
+            return FIXED_TO_DATA.format(address=self.fixed_address(segment, index))
+        if segment in NEAR_SEGMENTS and index <= PUSH_CHAIN_LIMIT:
+            return NEAR_TO_DATA.format(address=self.chain_address(SEG[segment], index))
+        return PUSH_DATA[segment].format(
+            index=str(index), segment=SEG[segment],
+            static=self.filename + ".{}".format(index))
+
+    def spill(self) -> None:
+        """
+        Write the top of the stack back to the stack, if it is cached in D
+        """
+        if self.tos_in_d:
+            self.output_stream.write(DATA_TO_STACK)
+            self.tos_in_d = False
+
+    def fixed_address(self, segment: str, index: int) -> str:
+        """
+        Args:
+            segment (str): "temp", "pointer" or "static".
+            index (int): the index in the memory segment.
+
+        Returns:
+            str: the symbol of the entry.
+        """
+        if segment == "static":
+            return self.filename + ".{}".format(index)
+        return FIXED_ADDRESS[segment][index]
+
+    @staticmethod
+    def chain_address(segment: str, index: int) -> str:
+        """
+        Args:
+            segment (str): the pointer of the segment, e.g. "LCL".
+            index (int): a small index in the segment.
+
+        Returns:
+            str: code that loads the address of the entry into A.
+        """
+        if index == 0:
+            return SEGMENT_BASE.format(segment=segment)
+        return SEGMENT_NEXT.format(segment=segment) + "A=A+1\n" * (index - 1)
+
     def write_branching(self, command: str, label: str) -> None:
         """Writes the assembly code that is the translation of the given
         command, where command is of kind "C_BRANCHING"
@@ -179,8 +451,42 @@ class CodeWriter:
             label (str): the label of the loop to jump to, if needed
         """
         label_name = self.cur_function + "$" + label
+        if command == "if-goto" and self.tos_in_d:
+            self.output_stream.write(CACHED_IF_GOTO.format(label=label_name))
+            self.tos_in_d = False
+            return
+        self.spill()
         self.output_stream.write(BRANCHING[command].format(label=label_name))
 
+    def write_routine_call(self, routine: str, return_label: str) -> None:
+        """Writes a call of a shared routine, which returns right after it.
+
+        Args:
+            routine (str): the kind of routine, a key of ROUTINES.
+            return_label (str): a label unique in the whole program.
+        """
+        self.routines.add(routine)
+        self.output_stream.write(CALL_ROUTINE.format(
+            return_label=return_label,
+            routine=ROUTINE.format(name=routine.upper())))
+
+    def write_routines(self, routines: typing.Iterable[str]) -> None:
+        """Writes the shared routines, once for the whole program. They are
+        placed after the program behind an endless loop, so running past the
+        end of the program never enters them.
+
+        Args:
+            routines (typing.Iterable[str]): the routines called anywhere in
+                the program.
+        """
+        routines = sorted(routines)
+        if not routines:
+            return
+        self.write_comment("Shared routines")
+        self.output_stream.write(HALT)
+        for routine in routines:
+            self.output_stream.write(ROUTINES[routine])
+
     def write_comment(self, comment: str) -> None:
         """
         write as a comment the next VM command that translated.
@@ -209,20 +515,41 @@ class CodeWriter:
             function_mame (str): the name of the function.
             num_vals (int): the number of local variables for the function.
         """
+        self.spill()
         self.output_stream.write(FUNCTION.format(label=function_mame))
-        self.write_comment("Initialize {} locals to 0".format(num_vals))
-        label = function_mame + "$LOOP"
-        self.output_stream.write(TODO_N_TIMES.format(num=num_vals, label=label, endlabel=label + "$END", TODO=PUSH["constant"].format(index=0)))
+        if num_vals:
+            self.write_comment("Initialize {} locals to 0".format(num_vals))
+        if num_vals == 1:
+            self.output_stream.write(ONE_LOCAL)
+        elif 1 < num_vals <= UNROLL_LOCALS:
+            self.output_stream.write(FIRST_LOCAL + NEXT_LOCAL * (num_vals - 1) + LOCALS_TO_SP)
+        elif num_vals > UNROLL_LOCALS:
+            self.output_stream.write(CLEAR_LOCALS_LOOP.format(num=num_vals, label=function_mame + "$$LOCALS"))
         self.cur_function = function_mame
 
     def write_call(self, function_mame: str, num_args: int) -> None:
         """
         Writes a call function code
         """
+        self.spill()
         self.write_comment("push return-address")
         returnAddress = "{function}$ret.{index}".format(function=self.cur_function, index=self.return_counter)
         self.return_counter += 1
+        if self.shared_call:
+            self.write_comment("R13 = f, R14 = n, goto $$CALL")
+            self.output_stream.write(LOAD_CALL_TARGET.format(function=function_mame))
+            self.output_stream.write(LOAD_NUM_ARGS.get(num_args, LOAD_NUM_ARGS_DEFAULT).format(nArgs=num_args))
+            self.write_routine_call("call", returnAddress)
+            return
         self.output_stream.write(RETURN_LABEL.format(label=returnAddress))
+        self.write_call_frame(function_mame, num_args)
+        self.write_comment("push return-address")
+        self.output_stream.write(BRANCHING["label"].format(label=returnAddress))
+
+    def write_call_frame(self, function_mame: str, num_args: int) -> None:
+        """
+        Writes the rest of a call, after the return address was pushed
+        """
         self.write_comment("push LCL ")
         self.output_stream.write(PUSH_SEG_ADDRESS.format(segment="LCL"))
         self.write_comment("push ARG ")
@@ -237,13 +564,45 @@ class CodeWriter:
         self.output_stream.write(REPOSITION_LCL)
         self.write_comment("goto f ")
         self.output_stream.write(BRANCHING["goto"].format(label=function_mame))
-        self.write_comment("push return-address")
-        self.output_stream.write(BRANCHING["label"].format(label=returnAddress))
+
+    def write_tail_call(self, function_mame: str, num_args: int) -> None:
+        """Writes the translation of a call followed by a return. When the
+        current function got num_args arguments, the called function takes
+        over its frame: the arguments are moved over those of the current
+        function, and it returns straight to the caller of the current
+        function, so the stack does not grow.
+
+        Args:
+            function_mame (str): the name of the called function.
+            num_args (int): the number of its arguments.
+        """
+        self.spill()
+        not_same_size = "{}$$tail.{}".format(self.cur_function, self.return_counter)
+        self.write_comment("if LCL-ARG == n+5, reuse the frame")
+        self.output_stream.write(SAME_FRAME_SIZE.format(
+            frame_size=num_args + 5, label=not_same_size))
+        if num_args > CHAIN_ARGUMENTS_LIMIT:
+            self.output_stream.write(FIRST_ARGUMENT_TO_TEMP.format(nArgs=num_args)
+                                     + MOVE_ARGUMENT * num_args)
+        else:
+            for i in range(num_args):
+                self.output_stream.write(ARGUMENT_FROM_TOP + "A=A-1\n" * (num_args - 1 - i) + "D=M\n"
+                                         + DATA_TO_NEAR.format(address=self.chain_address(SEG["argument"], i)))
+        self.output_stream.write(SP_TO_LCL + GOTO.format(label=function_mame))
+        self.output_stream.write(NEW_LABEL.format(label=not_same_size))
+        self.write_call(function_mame, num_args)
+        self.write_return()
 
 
     def write_return(self) -> None:
         """Writes the assembly code that is the translation of the return command.
         """
+        self.spill()
+        if self.shared_call:
+            self.write_comment("goto $$RETURN")
+            self.routines.add("return")
+            self.output_stream.write(GOTO.format(label=ROUTINE.format(name="RETURN")))
+            return
         self.write_comment("FRAME=LCL")
         self.output_stream.write(VALUE_TO_TEMP.format(segment=SEG["local"]))
         self.write_comment("RET=*(FRAME-5)")
@@ -0,0 +1,219 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import sys
+import typing
+from array import array
+import CodeWriter
+
+BINARY_EXTENSION = ".hackbin"   # Packed little-endian 16-bit words
+
+# {comp mnemonic : the a bit and the 6 c bits}, the same table as COMP_DICT
+# of the assembler (06/Code.py)
+COMP = {"0": 0b0101010, "1": 0b0111111, "-1": 0b0111010,
+        "D": 0b0001100, "A": 0b0110000, "M": 0b1110000,
+        "!D": 0b0001101, "!A": 0b0110001, "!M": 0b1110001,
+        "-D": 0b0001111, "-A": 0b0110011, "-M": 0b1110011,
+        "D+1": 0b0011111, "A+1": 0b0110111, "M+1": 0b1110111,
+        "D-1": 0b0001110, "A-1": 0b0110010, "M-1": 0b1110010,
+        "D+A": 0b0000010, "D+M": 0b1000010,
+        "D-A": 0b0010011, "D-M": 0b1010011,
+        "A-D": 0b0000111, "M-D": 0b1000111,
+        "D&A": 0b0000000, "D&M": 0b1000000,
+        "D|A": 0b0010101, "D|M": 0b1010101}
+# The CodeWriter writes commutative operations in either order
+for mnemonic in ("D+A", "D+M", "D&A", "D&M", "D|A", "D|M"):
+    COMP[mnemonic[2] + mnemonic[1] + mnemonic[0]] = COMP[mnemonic]
+# {shift mnemonic : its a bit and c bits}, of the shift extension of the
+# assembler, whose instructions start with 101 instead of 111
+SHIFT = {"D>>": 0b0010000, "D<<": 0b0110000, "A>>": 0b0000000,
+         "A<<": 0b0100000, "M>>": 0b1000000, "M<<": 0b1100000}
+DEST = {"": 0, "M": 1, "D": 2, "MD": 3, "A": 4, "AM": 5, "AD": 6, "AMD": 7}
+JUMP = {"": 0, "JGT": 1, "JEQ": 2, "JGE": 3, "JLT": 4, "JNE": 5, "JLE": 6,
+        "JMP": 7}
+PREDEFINED = dict({"R{}".format(i): i for i in range(16)},
+                  SP=0, LCL=1, ARG=2, THIS=3, THAT=4, SCREEN=16384, KBD=24576)
+FIRST_VARIABLE = 16     # The address of the first static variable
+MAX_ADDRESS = 32767     # The largest value an A-instruction can load
+
+# Memoized encodings, {C-instruction text : 16-bit code}
+C_CACHE = {}
+# Pre-assembled complete templates of the CodeWriter, {their text : items}
+PRE_ASSEMBLED = {}
+
+
+class HackWriter:
+    """
+    An output stream for the CodeWriter that assembles the code it is given
+    as it is written, instead of keeping its text. The program is kept as a
+    list of items: an int is an encoded instruction, "@symbol" is an
+    A-instruction whose address is fixed up once the whole program is
+    written, and "(label)" marks the address of a label. The templates of
+    the CodeWriter are pre-assembled when this module is imported, other
+    code is assembled as it is written, through the memoized encodings of
+    its C-instructions.
+    """
+
+    def __init__(self) -> None:
+        """Creates a writer of an empty program."""
+        self.items = []
+
+    def write(self, code: typing.Union[str, typing.List]) -> None:
+        """Adds code to the end of the program.
+
+        Args:
+            code (typing.Union[str, typing.List]): assembly code, or the
+                items of code that was already assembled, as returned by
+                getvalue().
+        """
+        if isinstance(code, str):
+            self.items.extend(HackWriter.assemble(code))
+        else:
+            self.items.extend(code)
+
+    def getvalue(self) -> typing.List:
+        """
+        Returns:
+            typing.List: the items of the program, as described above.
+        """
+        return self.items
+
+    def resolve(self) -> array:
+        """
+        Returns:
+            array: the instructions of the program, as 16-bit words, with
+            every symbol replaced by the address of its label, of its
+            predefined register, or of a new variable.
+
+        Raises:
+            ValueError: if a label is beyond the addresses an A-instruction
+                can load, in a program larger than the ROM.
+        """
+        symbols = dict(PREDEFINED)
+        address = 0
+        for item in self.items:
+            if isinstance(item, str) and item[0] == "(":
+                symbols[item[1:-1]] = address   # The last definition wins
+            else:
+                address += 1
+        rom = array('H')
+        variable = FIRST_VARIABLE
+        for item in self.items:
+            if isinstance(item, int):
+                rom.append(item)
+            elif item[0] == "@":
+                symbol = item[1:]
+                if symbol not in symbols:
+                    symbols[symbol] = variable
+                    variable += 1
+                if symbols[symbol] > MAX_ADDRESS:
+                    raise ValueError("address out of range: {}".format(item))
+                rom.append(symbols[symbol])
+        return rom
+
+    def write_hack(self, output_file: typing.TextIO) -> None:
+        """Writes the program as .hack text, one binary word per line.
+
+        Args:
+            output_file (typing.TextIO): the .hack file.
+        """
+        output_file.write("".join("{0:016b}\n".format(word)
+                                  for word in self.resolve()))
+
+    def write_hackbin(self, output_file: typing.BinaryIO) -> None:
+        """Writes the program as a packed image of little-endian 16-bit
+        words, as the assembler does with --binary.
+
+        Args:
+            output_file (typing.BinaryIO): the .hackbin file.
+        """
+        rom = self.resolve()
+        if sys.byteorder != "little":
+            rom.byteswap()
+        output_file.write(rom.tobytes())
+
+    @staticmethod
+    def dumps(items: typing.List) -> str:
+        """
+        Return the given items as text, one per line, to keep in a cache
+        """
+        return "\n".join(str(item) for item in items)
+
+    @staticmethod
+    def loads(text: str) -> typing.List:
+        """
+        Return the items of a text returned by dumps()
+        """
+        return [int(line) if line[0].isdigit() else line
+                for line in text.splitlines()]
+
+    @staticmethod
+    def assemble(code: str) -> typing.List:
+        """
+        Args:
+            code (str): assembly code, as written by the CodeWriter.
+
+        Returns:
+            typing.List: its items, as described above.
+        """
+        items = PRE_ASSEMBLED.get(code)
+        if items is not None:
+            return items
+        items = []
+        for line in code.splitlines():
+            line = line.split("//", 1)[0].strip()
+            if not line:
+                continue
+            if line[0] == "(":
+                items.append(line)
+            elif line[0] == "@":
+                if line[1:].isdigit():
+                    address = int(line[1:])
+                    if address > MAX_ADDRESS:
+                        raise ValueError(
+                            "address out of range: {}".format(line))
+                    items.append(address)
+                else:
+                    items.append(line)
+            else:
+                items.append(HackWriter.encode(line))
+        return items
+
+    @staticmethod
+    def encode(command: str) -> int:
+        """
+        Return the 16-bit code of a C-instruction. Every distinct
+        instruction is split and translated only once.
+        """
+        code = C_CACHE.get(command)
+        if code is None:
+            dest, _, rest = command.rpartition("=")
+            comp, _, jump = rest.partition(";")
+            if comp in SHIFT:
+                prefix, comp_code = 0b101, SHIFT[comp]
+            else:
+                prefix, comp_code = 0b111, COMP.get(comp)
+            if comp_code is None or dest not in DEST or jump not in JUMP:
+                raise ValueError("unknown instruction: {}".format(command))
+            code = prefix << 13 | comp_code << 6 | DEST[dest] << 3 | JUMP[jump]
+            C_CACHE[command] = code
+        return code
+
+
+def pre_assemble(templates: typing.Iterable) -> None:
+    """
+    Assemble the templates of the CodeWriter that are complete, that is,
+    have no fields left to format, ahead of their first use
+    """
+    for template in templates:
+        if isinstance(template, dict):
+            pre_assemble(template.values())
+        elif isinstance(template, str) and template.endswith("\n") \
+                and "{" not in template:
+            PRE_ASSEMBLED[template] = HackWriter.assemble(template)
+
+pre_assemble(value for name, value in vars(CodeWriter).items()
+             if name.isupper())
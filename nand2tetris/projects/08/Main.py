@@ -4,74 +4,318 @@ https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
 and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
 Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
 """
+import argparse
+import functools
 import glob
+import io
 import os
-import sys
+import time
 import typing
+from concurrent.futures import ProcessPoolExecutor
 from Parser import Parser
 from CodeWriter import CodeWriter
+from VMOptimizer import VMOptimizer
+from BuildCache import BuildCache, MEGABYTE
+from HackWriter import HackWriter, BINARY_EXTENSION
 
 FLAG_INIT = False
 
-def run_through_vm_code(parser, code_write):
-    while parser.has_more_commands():
-        command_type = parser.command_type()
-        if not command_type:
-            parser.advance()
-            continue
-
-        code_write.write_comment(parser.input_lines[parser.current_line_index])
+def run_through_vm_code(commands, code_write):
+    for command_type, arguments, line in commands:
+        code_write.write_comment(line)
         if command_type == "C_ARITHMETIC":
-            code_write.write_arithmetic(parser.arg1())
+            code_write.write_arithmetic(*arguments)
         elif command_type == "C_PUSH" or command_type == "C_POP":
-            code_write.write_push_pop(command_type, parser.arg1(), parser.arg2())
+            code_write.write_push_pop(command_type, *arguments)
+        elif command_type == "C_MOVE":
+            code_write.write_move(*arguments)
         elif command_type == "C_BRANCHING":
-            code_write.write_branching(*parser.loop_labels())
+            code_write.write_branching(*arguments)
         elif command_type == "C_FUNCTION":
-            code_write.write_function(*parser.func_args())
+            code_write.write_function(*arguments)
         elif command_type == "C_CALL":
-            code_write.write_call(*parser.func_args())
+            code_write.write_call(*arguments)
+        elif command_type == "C_TAIL_CALL":
+            code_write.write_tail_call(*arguments)
         elif command_type == "C_RETURN":
             code_write.write_return()
-        parser.advance()
 
 
-def translate_file(input_file: typing.TextIO, output_file: typing.TextIO) -> None:
-    """Translates a single file.
+def translate_commands(filename: str, commands: typing.List[tuple],
+                       output_file: typing.TextIO,
+                       options: typing.Optional[dict] = None,
+                       optimizer: typing.Optional[VMOptimizer] = None
+                       ) -> typing.Set[str]:
+    """Translates the commands of a single file, without the bootstrap code.
 
     Args:
-        input_file (typing.TextIO): the file to translate.
+        filename (str): the name of the file, without its extension.
+        commands (typing.List[tuple]): its commands, as returned by
+            Parser.read_commands.
         output_file (typing.TextIO): writes all output to this file.
+        options (dict): keyword arguments of the CodeWriter.
+        optimizer (VMOptimizer): optimizes the commands before they are
+            translated, if given.
+
+    Returns:
+        typing.Set[str]: the shared routines the translated code calls.
+    """
+    code_writer = CodeWriter(output_file, **(options or {}))   # Write the hack code
+    if optimizer is not None:
+        commands = optimizer.optimize(commands)
+    code_writer.set_file_name(filename)
+    run_through_vm_code(commands, code_writer)
+    code_writer.spill()
+    return code_writer.routines
+
+
+def translate_job(program: tuple, options: typing.Optional[dict] = None,
+                  optimize: bool = False,
+                  cache: typing.Optional[BuildCache] = None,
+                  binary: bool = False) -> tuple:
+    """Translates a single file into a fragment of assembly code, without
+    the bootstrap code, which is written once by the caller. Every label the
+    fragment defines is qualified by the file or by one of its functions, so
+    fragments can be translated in any order, and runs in a worker process
+    in parallel mode.
+
+    Args:
+        program (tuple): (filename, commands) of the file, as read by
+            Parser.read_commands.
+        options (dict): keyword arguments of the CodeWriter.
+        optimize (bool): optimize the commands before they are translated.
+        cache (BuildCache): if given, a file whose commands did not change
+            is not translated again, its previous fragment is read from the
+            cache instead.
+        binary (bool): assemble the fragment with a HackWriter instead of
+            keeping its text.
+
+    Returns:
+        tuple: (the assembly code, or its items if binary, the shared
+        routines it calls, the VMOptimizer that optimized it or None, CPU
+        seconds spent, whether the fragment was found in the cache).
+    """
+    start = time.process_time()
+    filename, commands = program
+    if cache is not None:
+        # A fragment depends on the name of its file, through its labels
+        # and static variables, as much as on its commands
+        key = cache.key("\n".join(line for _, _, line in commands).encode(),
+                        " ".join([filename] + sorted(
+                            name for name, value in (options or {}).items()
+                            if value) + (["optimize"] if optimize else [])
+                            + (["hack"] if binary else [])))
+        data = cache.get(key)
+        if data is not None:
+            # The first line of an entry names the routines it calls
+            routines, code = data.decode().split("\n", 1)
+            if binary:
+                code = HackWriter.loads(code)
+            return code, set(routines.split()), None, \
+                time.process_time() - start, True
+    optimizer = VMOptimizer() if optimize else None
+    output_file = HackWriter() if binary else io.StringIO()
+    routines = translate_commands(filename, commands, output_file, options,
+                                  optimizer)
+    code = output_file.getvalue()
+    if cache is not None:
+        cache.put(key, "{}\n{}".format(
+            " ".join(sorted(routines)),
+            HackWriter.dumps(code) if binary else code).encode())
+    return code, routines, optimizer, time.process_time() - start, False
+
+
+def translate_program(programs: typing.List[tuple],
+                      output_file: typing.TextIO,
+                      options: typing.Optional[dict] = None,
+                      optimizer: typing.Optional[VMOptimizer] = None,
+                      jobs: typing.Optional[int] = None,
+                      cache: typing.Optional[BuildCache] = None) -> None:
+    """Translates the files of a program into a single assembly file. The
+    files are translated independently of each other, across a pool of
+    worker processes if jobs is given, and their code is written in the
+    order of the given files, no matter which worker finished first.
+
+    Args:
+        programs (typing.List[tuple]): a (filename, commands) tuple of every
+            file of the program.
+        output_file (typing.TextIO): writes all output to this file. If it
+            is a HackWriter, the fragments are assembled by the workers.
+        options (dict): keyword arguments of the CodeWriter.
+        optimizer (VMOptimizer): optimizes the commands before they are
+            translated, if given. The statistics of the workers are added
+            to it.
+        jobs (int): number of worker processes, or None to translate the
+            files in this process.
+        cache (BuildCache): an optional cache of fragments. The workers use
+            copies of it, their hits and misses are added to it here.
     """
     global FLAG_INIT
-    input_filename, input_extension = os.path.splitext(os.path.basename(input_file.name))
-    code_writer = CodeWriter(output_file)   # Write the hack code
+    code_writer = CodeWriter(output_file, **(options or {}))
     if not FLAG_INIT:
         code_writer.write_init()
         FLAG_INIT = True
-    parser = Parser(input_file)  # Parser Object
-    code_writer.set_file_name(input_filename)
-    run_through_vm_code(parser, code_writer)
+    job = functools.partial(translate_job, options=options,
+                            optimize=optimizer is not None, cache=cache,
+                            binary=isinstance(output_file, HackWriter))
+    start = time.perf_counter()
+    if jobs is None:
+        results = list(map(job, programs))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(job, programs))
+    wall_time = time.perf_counter() - start
+    routines = set(code_writer.routines)
+    for code, file_routines, file_optimizer, _, cache_hit in results:
+        if cache is not None and jobs is not None:
+            if cache_hit:
+                cache.hits += 1
+            else:
+                cache.misses += 1
+        output_file.write(code)
+        routines |= file_routines
+        if file_optimizer is not None:
+            optimizer.merge(file_optimizer)
+    code_writer.write_routines(routines)
+    if jobs is not None:
+        cpu_time = sum(result[3] for result in results)
+        print("Translated {} files with {} jobs: wall {:.3f}s, "
+              "CPU {:.3f}s ({:.1f}x)".format(
+                  len(results), jobs, wall_time, cpu_time,
+                  cpu_time / wall_time if wall_time else 0))
+
+
+def count_instructions(code: str) -> int:
+    """
+    Return the number of instructions in the given assembly code
+    """
+    return sum(1 for line in code.splitlines()
+               if line.strip() and not line.startswith(("//", "(")))
+
+
+def remove_dead_functions(programs: typing.List[tuple],
+                          options: typing.Optional[dict] = None
+                          ) -> typing.Tuple[typing.List[tuple], str]:
+    """Leaves out the functions that cannot be reached from Sys.init.
+
+    Args:
+        programs (typing.List[tuple]): a (filename, commands) tuple of every
+            file of the program.
+        options (dict): keyword arguments of the CodeWriter, used to measure
+            the code of the removed functions.
+
+    Returns:
+        typing.Tuple[typing.List[tuple], str]: the programs without the
+        unreachable functions, and a line that describes what was removed.
+    """
+    reachable = VMOptimizer.reachable_functions(
+        command for filename, commands in programs for command in commands)
+    if reachable is None:
+        return programs, "no Sys.init, no function was removed"
+    kept_programs = []
+    removed_functions = 0
+    removed_code = io.StringIO()
+    for filename, commands in programs:
+        kept, removed = VMOptimizer.split_functions(commands, reachable)
+        kept_programs.append((filename, kept))
+        removed_functions += sum(1 for command in removed
+                                 if command[0] == "C_FUNCTION")
+        code_writer = CodeWriter(removed_code, **(options or {}))
+        code_writer.set_file_name(filename)
+        run_through_vm_code(removed, code_writer)
+        code_writer.spill()
+    return kept_programs, "removed {} unreachable functions, {} of {} " \
+        "kept ({} instructions of ROM saved)".format(
+            removed_functions, len(reachable), len(reachable) + removed_functions,
+            count_instructions(removed_code.getvalue()))
 
 if "__main__" == __name__:
-    # Parses the input path and calls translate_file on each input file
-    if not len(sys.argv) == 2:
-        sys.exit("Invalid usage, please use: VMtranslator <input path>")
-    argument_path = os.path.abspath(sys.argv[1])
+    # Parses the input path and translates the files it names
+    argument_parser = argparse.ArgumentParser(prog="VMtranslator")
+    argument_parser.add_argument("input_path")
+    argument_parser.add_argument(
+        "--shared-compare", action="store_true",
+        help="translate eq, gt and lt into short calls of a single shared "
+             "routine of each kind")
+    argument_parser.add_argument(
+        "--shared-call", action="store_true",
+        help="translate call and return into jumps to a single shared "
+             "routine that implements the calling convention")
+    argument_parser.add_argument(
+        "--cache-tos", action="store_true",
+        help="keep the top of the stack in D between commands")
+    argument_parser.add_argument(
+        "--optimize", action="store_true",
+        help="optimize the VM commands before translating them, and print "
+             "how much each pass saved")
+    argument_parser.add_argument(
+        "--prune", action="store_true",
+        help="leave out the functions that cannot be called from Sys.init")
+    argument_parser.add_argument(
+        "--hack", action="store_true",
+        help="write the assembled program (.hack) instead of its assembly "
+             "code, without going through assembly text")
+    argument_parser.add_argument(
+        "--hackbin", action="store_true",
+        help="write the assembled program as a packed " + BINARY_EXTENSION +
+             " ROM image instead of its assembly code")
+    argument_parser.add_argument(
+        "--jobs", type=int, metavar="N",
+        help="translate the files across a pool of N worker processes")
+    argument_parser.add_argument(
+        "--cache", metavar="DIR",
+        help="skip the files that did not change since they were translated, "
+             "by keeping their fragments in the given directory")
+    argument_parser.add_argument(
+        "--cache-size", type=int, default=256, metavar="MB",
+        help="the size cap of the cache directory (default: 256 MB)")
+    arguments = argument_parser.parse_args()
+    if arguments.jobs is not None and arguments.jobs < 1:
+        argument_parser.error("--jobs must be at least 1")
+    optimizer = VMOptimizer() if arguments.optimize else None
+    cache = None
+    if arguments.cache is not None:
+        cache = BuildCache(arguments.cache, arguments.cache_size * MEGABYTE)
+    options = {"shared_compare": arguments.shared_compare,
+               "shared_call": arguments.shared_call,
+               "cache_tos": arguments.cache_tos}
+    argument_path = os.path.abspath(arguments.input_path)
     if os.path.isdir(argument_path):
         files_to_translate = [
             os.path.join(argument_path, filename)
-            for filename in os.listdir(argument_path)]
+            for filename in sorted(os.listdir(argument_path))]
         output_path = os.path.join(argument_path, os.path.basename(
             argument_path))
     else:
         files_to_translate = [argument_path]
         output_path, extension = os.path.splitext(argument_path)
-    output_path += ".asm"
-    with open(output_path, 'w') as output_file:
-        for input_path in files_to_translate:
-            filename, extension = os.path.splitext(input_path)
-            if extension.lower() != ".vm":
-                continue
-            with open(input_path, 'r') as input_file:
-                translate_file(input_file, output_file)
+    programs = []   # (filename, commands) of every file
+    for input_path in files_to_translate:
+        filename, extension = os.path.splitext(input_path)
+        if extension.lower() != ".vm":
+            continue
+        with open(input_path, 'r') as input_file:
+            programs.append((os.path.basename(filename),
+                             Parser(input_file).read_commands()))
+    if arguments.prune:
+        programs, report = remove_dead_functions(programs, options)
+        print("{}: {}".format(argument_path, report))
+    if arguments.hack or arguments.hackbin:
+        hack_writer = HackWriter()
+        translate_program(programs, hack_writer, options, optimizer,
+                          arguments.jobs, cache)
+        if arguments.hackbin:
+            with open(output_path + BINARY_EXTENSION, 'wb') as output_file:
+                hack_writer.write_hackbin(output_file)
+        else:
+            with open(output_path + ".hack", 'w') as output_file:
+                hack_writer.write_hack(output_file)
+    else:
+        with open(output_path + ".asm", 'w') as output_file:
+            translate_program(programs, output_file, options, optimizer,
+                              arguments.jobs, cache)
+    if optimizer is not None:
+        print("{}: {}".format(argument_path, optimizer.summary()))
+    if cache is not None:
+        cache.trim()
+        print(cache.summary())
@@ -115,4 +115,30 @@ class Parser:
             called only if the current command is "C_FUNCTION" or "C_CALL"
         """
         splited_command = self.current_command.split()
-        return splited_command[1], int(splited_command[2])
\ No newline at end of file
+        return splited_command[1], int(splited_command[2])
+
+    def read_commands(self) -> typing.List[tuple]:
+        """Reads all the remaining commands of the input.
+
+        Returns:
+            typing.List[tuple]: a (command type, arguments, line) tuple of
+            every command, where the arguments are those the CodeWriter
+            method of the command type takes.
+        """
+        commands = []
+        while self.has_more_commands():
+            command_type = self.command_type()
+            if command_type == "C_ARITHMETIC":
+                arguments = (self.arg1(),)
+            elif command_type == "C_PUSH" or command_type == "C_POP":
+                arguments = (self.arg1(), self.arg2())
+            elif command_type == "C_BRANCHING":
+                arguments = self.loop_labels()
+            elif command_type == "C_FUNCTION" or command_type == "C_CALL":
+                arguments = self.func_args()
+            else:
+                arguments = ()
+            if command_type:
+                commands.append((command_type, arguments, self.current_command))
+            self.advance()
+        return commands
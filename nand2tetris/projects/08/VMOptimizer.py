@@ -0,0 +1,262 @@
+"""This file is part of nand2tetris, as taught in The Hebrew University,
+and was written by Aviv Yaish according to the specifications given in  
+https://www.nand2tetris.org (Shimon Schocken and Noam Nisan, 2017)
+and as allowed by the Creative Common Attribution-NonCommercial-ShareAlike 3.0 
+Unported License (https://creativecommons.org/licenses/by-nc-sa/3.0/).
+"""
+import typing
+
+# The passes of the optimizer, in the order they are reported
+PASSES = ("constant_folding", "direct_move", "double_not", "jump_threading",
+          "tail_call")
+# {command : x op y} of the binary commands that constants are folded over
+FOLD = {"add": lambda x, y: x + y,
+        "sub": lambda x, y: x - y,
+        "and": lambda x, y: x & y,
+        "or": lambda x, y: x | y}
+MAX_CONSTANT = 32767    # The largest value 'push constant' can load
+# Commands that cancel each other out when they follow one another
+SELF_INVERSE = ("not", "neg")
+ENTRY_FUNCTION = "Sys.init"     # The function the bootstrap code calls
+
+
+class VMOptimizer:
+    """
+    Optimizer over the commands of a VM file, as read by
+    Parser.read_commands, applied before they are translated. Passes are
+    applied again and again until none of them changes the commands, and
+    the number of commands each pass saved (or rewrote, for jumps) is
+    counted.
+    """
+
+    def __init__(self) -> None:
+        """Creates an optimizer with empty statistics."""
+        self.saved = dict.fromkeys(PASSES, 0)   # {pass : commands}
+        self.input_size = 0
+        self.output_size = 0
+
+    def optimize(self, commands: typing.List[tuple]) -> typing.List[tuple]:
+        """
+        Args:
+            commands (typing.List[tuple]): (command type, arguments, line)
+                tuples, as returned by Parser.read_commands.
+
+        Returns:
+            typing.List[tuple]: the optimized commands. A push followed by
+            a pop becomes a "C_MOVE" command, whose arguments are those of
+            CodeWriter.write_move, and a call followed by a return in a
+            function becomes a "C_TAIL_CALL" command, whose arguments are
+            those of CodeWriter.write_tail_call.
+        """
+        self.input_size += len(commands)
+        while True:
+            optimized = self.fold_constants(commands)
+            optimized = self.remove_double_nots(optimized)
+            optimized = self.thread_jumps(optimized)
+            if optimized == commands:
+                break
+            commands = optimized
+        commands = self.merge_moves(commands)
+        commands = self.merge_tail_calls(commands)
+        self.output_size += len(commands)
+        return commands
+
+    def merge(self, other: "VMOptimizer") -> None:
+        """Adds the statistics of another optimizer to those of this one.
+
+        Args:
+            other (VMOptimizer): an optimizer that ran over other files.
+        """
+        for name in PASSES:
+            self.saved[name] += other.saved[name]
+        self.input_size += other.input_size
+        self.output_size += other.output_size
+
+    def summary(self) -> str:
+        """
+        Return a line that describes how much each pass saved
+        """
+        return "{} -> {} commands ({})".format(
+            self.input_size, self.output_size, ", ".join(
+                "{} {}".format(name.replace("_", " "), self.saved[name])
+                for name in PASSES))
+
+    def fold_constants(self, commands: typing.List[tuple]) -> typing.List[tuple]:
+        """
+        Replace 'push constant a', 'push constant b', 'op' by a single push
+        of a op b, when the result can be pushed as a constant
+        """
+        optimized = []
+        for command in commands:
+            command_type, arguments, line = command
+            if command_type == "C_ARITHMETIC" and arguments[0] in FOLD \
+                    and len(optimized) >= 2 \
+                    and VMOptimizer.constant(optimized[-2]) is not None \
+                    and VMOptimizer.constant(optimized[-1]) is not None:
+                x = VMOptimizer.constant(optimized[-2])
+                y = VMOptimizer.constant(optimized[-1])
+                value = FOLD[arguments[0]](x, y) & 0xFFFF
+                if value <= MAX_CONSTANT:
+                    del optimized[-2:]
+                    optimized.append(("C_PUSH", ("constant", value),
+                                      "push constant {}".format(value)))
+                    self.saved["constant_folding"] += 2
+                    continue
+            optimized.append(command)
+        return optimized
+
+    def remove_double_nots(self,
+                           commands: typing.List[tuple]) -> typing.List[tuple]:
+        """
+        Remove 'not', 'not' (and 'neg', 'neg'), which leave the top of the
+        stack as it was
+        """
+        optimized = []
+        for command in commands:
+            if command[0] == "C_ARITHMETIC" and command[1][0] in SELF_INVERSE \
+                    and optimized and optimized[-1][:2] == command[:2]:
+                optimized.pop()
+                self.saved["double_not"] += 2
+                continue
+            optimized.append(command)
+        return optimized
+
+    def thread_jumps(self, commands: typing.List[tuple]) -> typing.List[tuple]:
+        """
+        Make a goto or an if-goto to a label that is followed by 'goto L'
+        jump to L directly. Labels are looked up in the function of the
+        jump only, as they are translated.
+        """
+        targets = {}    # {(function, label) : the label its goto leads to}
+        function = ""
+        for i, (command_type, arguments, line) in enumerate(commands):
+            if command_type == "C_FUNCTION":
+                function = arguments[0]
+            elif command_type == "C_BRANCHING" and arguments[0] == "label":
+                k = i + 1
+                while k < len(commands) and commands[k][0] == "C_BRANCHING" \
+                        and commands[k][1][0] == "label":
+                    k += 1
+                if k < len(commands) and commands[k][0] == "C_BRANCHING" \
+                        and commands[k][1][0] == "goto":
+                    targets[(function, arguments[1])] = commands[k][1][1]
+        optimized = []
+        function = ""
+        for command in commands:
+            command_type, arguments, line = command
+            if command_type == "C_FUNCTION":
+                function = arguments[0]
+            elif command_type == "C_BRANCHING" and arguments[0] != "label":
+                label = arguments[1]
+                seen = {label}
+                while (function, label) in targets \
+                        and targets[(function, label)] not in seen:
+                    label = targets[(function, label)]
+                    seen.add(label)
+                if label != arguments[1]:
+                    command = (command_type, (arguments[0], label),
+                               "{} {}".format(arguments[0], label))
+                    self.saved["jump_threading"] += 1
+            optimized.append(command)
+        return optimized
+
+    def merge_moves(self, commands: typing.List[tuple]) -> typing.List[tuple]:
+        """
+        Replace 'push X', 'pop Y' by a single move from X to Y, which does
+        not go through the stack
+        """
+        optimized = []
+        for command in commands:
+            if command[0] == "C_POP" and command[1][0] != "constant" \
+                    and optimized and optimized[-1][0] == "C_PUSH":
+                push = optimized.pop()
+                optimized.append(("C_MOVE", push[1] + command[1],
+                                  "{} / {}".format(push[2], command[2])))
+                self.saved["direct_move"] += 1
+                continue
+            optimized.append(command)
+        return optimized
+
+    def merge_tail_calls(self,
+                         commands: typing.List[tuple]) -> typing.List[tuple]:
+        """
+        Replace 'call g n', 'return' in a function by a single tail call,
+        which reuses the frame of the function
+        """
+        optimized = []
+        function = None
+        for command in commands:
+            if command[0] == "C_FUNCTION":
+                function = command[1][0]
+            elif command[0] == "C_RETURN" and function is not None \
+                    and optimized and optimized[-1][0] == "C_CALL":
+                call = optimized.pop()
+                optimized.append(("C_TAIL_CALL", call[1],
+                                  "{} / {}".format(call[2], command[2])))
+                self.saved["tail_call"] += 1
+                continue
+            optimized.append(command)
+        return optimized
+
+    @staticmethod
+    def reachable_functions(commands: typing.Iterable[tuple]
+                            ) -> typing.Optional[typing.Set[str]]:
+        """
+        Args:
+            commands (typing.Iterable[tuple]): the commands of the whole
+                program, as returned by Parser.read_commands.
+
+        Returns:
+            typing.Optional[typing.Set[str]]: the functions that can be
+            reached from Sys.init over the call graph, or None if the
+            program does not define Sys.init.
+        """
+        calls = {}      # {function : the functions it calls}
+        function = None
+        for command_type, arguments, line in commands:
+            if command_type == "C_FUNCTION":
+                function = arguments[0]
+                calls.setdefault(function, set())
+            elif command_type == "C_CALL" and function is not None:
+                calls[function].add(arguments[0])
+        if ENTRY_FUNCTION not in calls:
+            return None
+        reachable = {ENTRY_FUNCTION}
+        pending = [ENTRY_FUNCTION]
+        while pending:
+            for callee in calls.get(pending.pop(), ()):
+                if callee not in reachable:
+                    reachable.add(callee)
+                    pending.append(callee)
+        return reachable
+
+    @staticmethod
+    def split_functions(commands: typing.List[tuple],
+                        functions: typing.Set[str]
+                        ) -> typing.Tuple[typing.List[tuple], typing.List[tuple]]:
+        """
+        Args:
+            commands (typing.List[tuple]): the commands of a file.
+            functions (typing.Set[str]): the functions to keep.
+
+        Returns:
+            typing.Tuple[typing.List[tuple], typing.List[tuple]]: the commands
+            of the given functions (and any command before the first
+            function), and the commands of all the other functions.
+        """
+        kept, removed = [], []
+        keep = True
+        for command in commands:
+            if command[0] == "C_FUNCTION":
+                keep = command[1][0] in functions
+            (kept if keep else removed).append(command)
+        return kept, removed
+
+    @staticmethod
+    def constant(command: tuple) -> typing.Optional[int]:
+        """
+        Return the value a command pushes, if it is 'push constant'
+        """
+        if command[0] == "C_PUSH" and command[1][0] == "constant":
+            return command[1][1]
+        return None